@@ -1,37 +1,65 @@
 import sys
 import numpy as np
 
+BLOCK_BYTES = 64 * 2**20  # size of the per-block (queries x database graphs) comparison
+
+def pack_features(features):
+    # one bit per feature, padded to whole uint64 words (zero padding never breaks containment)
+    bits = np.packbits(features.astype(bool), axis=1)
+    pad = -bits.shape[1] % 8
+    if pad or bits.shape[1] == 0:
+        bits = np.pad(bits, ((0, 0), (0, pad or 8)))
+    return np.ascontiguousarray(bits).view(np.uint64)
+
+def is_binary(features):
+    return features.size == 0 or (features.min() >= 0 and features.max() <= 1)
+
+def contained_block(q_block, db, binary):
+    # (queries x db) mask of q <= db in every feature: word-wise q & ~db == 0 on packed bits,
+    # a column-wise comparison otherwise
+    fail = np.zeros((len(q_block), len(db)), dtype=bool)
+    for j in range(q_block.shape[1]):
+        if binary:
+            fail |= (q_block[:, j, np.newaxis] & db[np.newaxis, :, j]) != 0
+        else:
+            fail |= q_block[:, j, np.newaxis] > db[np.newaxis, :, j]
+    return ~fail
+
 def generate_candidates_simple(db_features_file, query_features_file, output_file):
     db_features = np.load(db_features_file)
     query_features = np.load(query_features_file)
-    
-    
-    num_queries = query_features.shape[0]
-    num_db = db_features.shape[0]
-    
+
+    binary = is_binary(db_features) and is_binary(query_features)
+    if binary:
+        db = ~pack_features(db_features)   # kept inverted: a query fails where q & ~db != 0
+        queries = pack_features(query_features)
+    else:
+        print("Features are not 0/1; comparing counts column by column")
+        db, queries = db_features, query_features
+
+    num_queries = queries.shape[0]
+    num_db = db.shape[0]
+    block = max(1, BLOCK_BYTES // (8 * max(num_db, 1)))
+    # 1-based ids as strings, built once: formatting ints per row dominated large outputs
+    db_ids = np.array([str(i) for i in range(1, num_db + 1)], dtype=object)
+
     with open(output_file, 'w') as f:
-        for q_idx in range(num_queries):
-            q_vec = query_features[q_idx]
-            
-            candidates = []
-            for db_idx in range(num_db):
-                db_vec = db_features[db_idx]
-                
-                if np.all(q_vec <= db_vec):
-                    candidates.append(db_idx + 1)
-            
-            f.write(f"q # {q_idx + 1}\n")
-            if candidates:
-                f.write(f"c # {' '.join(map(str, candidates))}\n")
-            else:
-                f.write(f"c #\n")
-            
-            if (q_idx + 1) % 10 == 0:
-                print(f"Processed {q_idx + 1}/{num_queries} queries")
-    
+        for start in range(0, num_queries, block):
+            hits = contained_block(queries[start:start + block], db, binary)
+            for i, row in enumerate(hits, start):
+                candidates = db_ids[np.flatnonzero(row)]
+
+                f.write(f"q # {i + 1}\n")
+                if len(candidates):
+                    f.write(f"c # {' '.join(candidates.tolist())}\n")
+                else:
+                    f.write(f"c #\n")
+
+            print(f"Processed {min(start + block, num_queries)}/{num_queries} queries")
+
 
 if __name__ == "__main__":
     if len(sys.argv) != 4:
         sys.exit(1)
-    
-    generate_candidates_simple(sys.argv[1], sys.argv[2], sys.argv[3])
\ No newline at end of file
+
+    generate_candidates_simple(sys.argv[1], sys.argv[2], sys.argv[3])
@@ -1,76 +1,592 @@
 import sys
+import os
+from contextlib import contextmanager
+import time
+import hashlib
 import urllib.request
-import json
+import re
+import multiprocessing
+from multiprocessing import shared_memory
 import numpy as np
 import matplotlib.pyplot as plt
 
 MY_ID = "siy257621"
+# DATASET_URL = "http://10.208.23.248:3000/dataset"
+DATASET_URL = os.environ.get('Q1_DATASET_URL', "http://hulk.cse.iitd.ac.in:3000/dataset")
+CACHE_DIR = os.environ.get('Q1_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'q1_datasets'))
+CACHE_MB = 2048   # fetched datasets kept before the least recently used are evicted
+STALE_TMP = 3600  # seconds after which a partial cache write is considered abandoned
 
-def load_data(source_dataset):
+def load_data(source_dataset, mmap=False, cache_dir=CACHE_DIR, cache_mb=CACHE_MB, url_base=DATASET_URL):
     if source_dataset.endswith('.npy'):
-        return np.load(source_dataset)
+        # mini-batch fits only touch a bounded working set, so the file can stay on disk
+        return np.load(source_dataset, mmap_mode='r' if mmap else None)
     if source_dataset.endswith('.json'):
-        with open(source_dataset, 'r') as f:
-            content = json.load(f)
-            return np.array(content["X"])
-        
-    # url = f"http://10.208.23.248:3000/dataset?student_id={MY_ID}&dataset_num={source_dataset}"
-    url = f"http://hulk.cse.iitd.ac.in:3000/dataset?student_id={MY_ID}&dataset_num={source_dataset}"
+        with open(source_dataset, 'rb') as f:
+            shape = json_x_shape(f)
+            f.seek(0)
+            return parse_json_x(f, shape)
+
+    url = f"{url_base}?student_id={MY_ID}&dataset_num={source_dataset}"
+    cached = None
+    if cache_dir:
+        # keyed on the dataset id and on the URL, so a different server never hits
+        key = hashlib.sha1(url.encode()).hexdigest()[:16]
+        cached = os.path.join(cache_dir, f"{''.join(c for c in source_dataset if c.isalnum())}-{key}.npy")
+        try:
+            X = np.load(cached, mmap_mode='r' if mmap else None)
+        except (OSError, ValueError):
+            X = None
+        if X is not None:
+            try:
+                os.utime(cached)    # mtime is the LRU order
+            except OSError:
+                pass    # a shared or read-only cache is still a hit
+            return X
     try:
         with urllib.request.urlopen(url) as r:
-            raw = r.read().decode('utf-8')
-            content = json.loads(raw)
-            return np.array(content["X"])
+            X = parse_json_x(r)
     except:
         sys.exit(1)
+    if cached is not None:
+        store_cached(cached, X, cache_mb * 2**20)
+    return X
+
+JSON_CHUNK = 8 * 2**20  # bytes of JSON text scanned at a time
+
+def json_x_segments(f):
+    # the raw text inside the outer brackets of the "X" array, one chunk at a time
+    head = b''
+    while True:
+        chunk = f.read(JSON_CHUNK)
+        if not chunk:
+            raise ValueError('no "X" array in the JSON input')
+        head += chunk
+        m = re.search(rb'"X"\s*:\s*\[', head)
+        if m:
+            break
+        head = head[-64:]    # the key may straddle two chunks
+    data = head[m.end():] or f.read(JSON_CHUNK)    # the bracket may end a chunk
+    depth = 1
+    while data:
+        b = np.frombuffer(data, dtype=np.uint8)
+        at = np.flatnonzero((b == ord('[')) | (b == ord(']')))
+        level = depth + np.cumsum(np.where(b[at] == ord('['), 1, -1))
+        end = np.flatnonzero(level == 0)
+        if len(end):
+            yield data[:at[end[0]]]
+            return
+        depth = int(level[-1]) if len(at) else depth
+        yield data
+        data = f.read(JSON_CHUNK)
+    raise ValueError('truncated "X" array in the JSON input')
+
+def json_x_shape(f):
+    # a list of n rows of d numbers has n opening brackets and n*d - 1 commas
+    rows = commas = 0
+    for seg in json_x_segments(f):
+        rows += seg.count(b'[')
+        commas += seg.count(b',')
+    return rows, (commas + 1) // rows if rows else 0
+
+def parse_json_x(f, shape=None):
+    # numbers of "X" parsed chunk-wise with np.fromstring once the brackets are dropped; rows
+    # go straight into the final array when the shape is known, else chunks are joined at the end
+    out = np.empty(shape[0] * shape[1]) if shape is not None else None
+    parts, filled, rows, carry = [], 0, 0, b''
+    for seg in json_x_segments(f):
+        rows += seg.count(b'[')
+        text = carry + seg
+        cut = text.rfind(b',') + 1    # a number may continue in the next chunk
+        carry = text[cut:]
+        vals = np.fromstring(text[:cut].translate(None, b'[]'), sep=',')
+        if out is not None:
+            out[filled:filled + len(vals)] = vals
+            filled += len(vals)
+        else:
+            parts.append(vals)
+    vals = np.fromstring(carry.translate(None, b'[]'), sep=',')
+    if out is None:
+        out = np.concatenate(parts + [vals])
+    else:
+        out[filled:filled + len(vals)] = vals
+    return out.reshape(rows, -1) if rows else out
+
+def store_cached(path, X, cap_bytes):
+    # written under a private name and renamed, so concurrent runs only ever see whole files
+    cache_dir = os.path.dirname(path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp, 'wb') as f:
+            np.save(f, X)
+        os.replace(tmp, path)
+    except OSError:
+        return      # read-only or full cache directory: run without it
+    entries = []
+    for name in os.listdir(cache_dir):
+        full = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(full)
+            if name.endswith('.tmp') and time.time() - st.st_mtime > STALE_TMP:
+                os.remove(full)
+            elif name.endswith('.npy'):
+                entries.append((st.st_mtime, st.st_size, full))
+        except OSError:
+            pass    # removed by another process meanwhile
+    total = sum(size for _, size, _ in entries)
+    for _, size, full in sorted(entries):
+        if total <= cap_bytes:
+            break
+        if full == path:
+            continue
+        try:
+            os.remove(full)
+        except OSError:
+            pass
+        total -= size
+
+MEM_CAP = 256 * 2**20  # bytes of per-chunk temporaries in the distance kernel
+
+def chunk_rows(n_cols, mem_cap=MEM_CAP):
+    # rows per chunk so that a float64 chunk of the data plus its distance rows fit in mem_cap
+    return max(1, mem_cap // (8 * n_cols))
+
+def row_norms(data):
+    x_sq = np.empty(len(data))
+    step = chunk_rows(data.shape[1])
+    for s in range(0, len(data), step):
+        x = np.asarray(data[s:s + step], dtype=np.float64)
+        x_sq[s:s + step] = np.einsum('ij,ij->i', x, x)
+    return x_sq
+
+def assign(data, cent, x_sq):
+    # labels via ||x||^2 - 2 x.c + ||c||^2, plus per-cluster counts and coordinate sums
+    k, d = cent.shape
+    c_sq = np.einsum('ij,ij->i', cent, cent)
+    labels = np.empty(len(data), dtype=np.intp)
+    counts = np.zeros(k)
+    sums = np.zeros((k, d))
+    step = chunk_rows(k + d)
+    for s in range(0, len(data), step):
+        x = np.asarray(data[s:s + step], dtype=np.float64)
+        dist = x @ cent.T
+        dist *= -2
+        dist += c_sq
+        dist += x_sq[s:s + step, np.newaxis]
+        lab = np.argmin(dist, axis=1)
+        labels[s:s + step] = lab
+        counts += np.bincount(lab, minlength=k)
+        # reuse the distance rows as a one-hot indicator so the sums are one matrix product
+        dist[:] = 0
+        dist[np.arange(len(lab)), lab] = 1
+        sums += dist.T @ x
+    return labels, counts, sums
 
-def run_kmeans(data, k):
+def wcss_of(data, cent, labels):
+    # per-cluster sums of squared distances to the centroids
+    total = np.zeros(len(cent))
+    step = chunk_rows(data.shape[1])
+    for s in range(0, len(data), step):
+        diff = np.asarray(data[s:s + step], dtype=np.float64) - cent[labels[s:s + step]]
+        total += np.bincount(labels[s:s + step], weights=np.einsum('ij,ij->i', diff, diff),
+                             minlength=len(cent))
+    return total
+
+def nearest_two(data, rows, cent, x_sq):
+    # nearest centroid with its distance and the distance to the runner-up, for data[rows]
+    k, d = cent.shape
+    c_sq = np.einsum('ij,ij->i', cent, cent)
+    labels = np.empty(len(rows), dtype=np.intp)
+    d1 = np.empty(len(rows))
+    d2 = np.full(len(rows), np.inf)
+    step = chunk_rows(k + d)
+    for s in range(0, len(rows), step):
+        r = rows[s:s + step]
+        x = np.asarray(data[r], dtype=np.float64)
+        dist = x @ cent.T
+        dist *= -2
+        dist += c_sq
+        dist += x_sq[r, np.newaxis]
+        np.maximum(dist, 0, out=dist)
+        lab = np.argmin(dist, axis=1)
+        at = np.arange(len(r))
+        labels[s:s + step] = lab
+        d1[s:s + step] = dist[at, lab]
+        if k > 1:
+            dist[at, lab] = np.inf
+            d2[s:s + step] = dist.min(axis=1)
+    return labels, np.sqrt(d1), np.sqrt(d2)
+
+def kmeanspp(data, k, x_sq):
+    # each next centroid is drawn with probability proportional to its squared distance
+    n = len(data)
+    cent = np.empty((k, data.shape[1]))
+    cent[0] = data[np.random.randint(n)]
+    closest = np.full(n, np.inf)
+    step = chunk_rows(data.shape[1] + 1)
+    for j in range(1, k):
+        c = cent[j - 1]
+        for s in range(0, n, step):
+            x = np.asarray(data[s:s + step], dtype=np.float64)
+            dist = x_sq[s:s + step] - 2 * (x @ c) + c @ c
+            np.minimum(closest[s:s + step], np.maximum(dist, 0), out=closest[s:s + step])
+        total = closest.sum()
+        if total > 0:
+            cum = np.cumsum(closest)
+            i = min(int(np.searchsorted(cum, np.random.random() * cum[-1], side='right')), n - 1)
+        else:
+            i = np.random.randint(n)    # fewer distinct points than k
+        cent[j] = data[i]
+    return cent
+
+def init_centroids(data, k, x_sq, init):
+    if init == 'kmeans++':
+        return kmeanspp(data, k, x_sq)
     idx = np.random.choice(len(data), k, replace=False)
-    cent = data[idx]
-    for _ in range(100):
-        diff = data[:, np.newaxis] - cent
-        dist = np.sum(diff**2, axis=2)
-        labels = np.argmin(dist, axis=1)
-        new_cent = []
-        for i in range(k):
-            cluster_pts = data[labels == i]
-            if len(cluster_pts) > 0:
-                new_cent.append(cluster_pts.mean(axis=0))
-            else:
-                new_cent.append(cent[i])
-        new_cent = np.array(new_cent)
+    return np.asarray(data[idx], dtype=np.float64)
+
+def distinct_rows(n, k):
+    # k distinct row indices, sorted for a memory-mapped read, without a permutation of n
+    if n <= 4 * k:
+        return np.sort(np.random.permutation(n)[:k])
+    idx = np.unique(np.random.randint(0, n, 2 * k))
+    while len(idx) < k:
+        idx = np.unique(np.concatenate([idx, np.random.randint(0, n, k)]))
+    return np.sort(np.random.permutation(idx)[:k])   # drop the surplus at random, not the largest
+
+MB_BATCH = 1024   # rows per mini-batch
+MB_STEPS = 300    # most mini-batch updates per fit on small inputs
+MB_EPOCHS = 3     # most passes over the data per fit on large ones
+MB_TOL = 1e-7     # stop once a batch moves the centroids less than this share of its mean ||x||^2
+
+def run_minibatch(data, k, init, batch, order, cent=None):
+    # mini-batch k-means: every centroid is the running mean of the points assigned to it
+    # so far, fed one random or sequential batch at a time; data may be memory-mapped
+    n = len(data)
+    batch = min(batch, n)
+    if cent is not None:
+        cent = cent.copy()
+    elif init == 'kmeans++':
+        sample = np.unique(np.random.randint(0, n, max(3 * batch, k)))
+        if len(sample) < k:
+            sample = np.arange(n)
+        x = np.asarray(data[sample], dtype=np.float64)
+        cent = kmeanspp(x, k, row_norms(x))
+    else:
+        cent = np.asarray(data[distinct_rows(n, k)], dtype=np.float64)
+    counts = np.zeros(k)
+    # a sequential fit has only seen a prefix of the file (e.g. one cluster of sorted data)
+    # until its first full pass, so it never stops before that
+    first_pass = -(-n // batch) if order == 'sequential' else 0
+    for step in range(max(MB_STEPS, MB_EPOCHS * -(-n // batch))):
+        if order == 'sequential':
+            s = (step * batch) % n
+            x = np.asarray(data[s:s + batch], dtype=np.float64)
+        else:
+            x = np.asarray(data[np.sort(np.random.randint(0, n, batch))], dtype=np.float64)
+        x_sq = np.einsum('ij,ij->i', x, x)
+        _, batch_counts, batch_sums = assign(x, cent, x_sq)
+        counts += batch_counts
+        hit = batch_counts > 0
+        rate = (batch_counts[hit] / counts[hit])[:, np.newaxis]
+        new_cent = cent.copy()
+        new_cent[hit] += rate * (batch_sums[hit] / batch_counts[hit, np.newaxis] - cent[hit])
+        shift = ((new_cent - cent)**2).sum()
+        cent = new_cent
+        if step + 1 >= first_pass and shift <= MB_TOL * x_sq.mean():
+            break
+    return cent, streaming_wcss(data, cent), step + 1
+
+def streaming_wcss(data, cent):
+    # exact per-cluster WCSS in one pass over the data, one chunk resident at a time
+    total = np.zeros(len(cent))
+    step = chunk_rows(len(cent) + data.shape[1])
+    for s in range(0, len(data), step):
+        x = np.asarray(data[s:s + step], dtype=np.float64)
+        labels, _, _ = nearest_two(x, np.arange(len(x)), cent, np.einsum('ij,ij->i', x, x))
+        diff = x - cent[labels]
+        total += np.bincount(labels, weights=np.einsum('ij,ij->i', diff, diff), minlength=len(cent))
+    return total
+
+MAX_ITER = 100   # Lloyd and Hamerly iterations per fit
+
+def run_kmeans(data, k, algo='lloyd', init='random', batch=MB_BATCH, order='random'):
+    return fit_kmeans(data, k, algo, init, batch, order)[1].sum()
+
+def fit_kmeans(data, k, algo='lloyd', init='random', batch=MB_BATCH, order='random', cent=None):
+    # centroids, per-cluster WCSS and iterations run; ``cent`` replaces the seeding
+    if algo == 'minibatch':
+        return run_minibatch(data, k, init, batch, order, cent)
+    x_sq = row_norms(data)
+    if cent is None:
+        cent = init_centroids(data, k, x_sq, init)
+    if algo == 'hamerly':
+        cent, labels, n_iter = hamerly(data, cent, x_sq)
+        return cent, wcss_of(data, cent, labels), n_iter
+    for n_iter in range(1, MAX_ITER + 1):
+        labels, counts, sums = assign(data, cent, x_sq)
+        # empty clusters keep their previous centroid
+        new_cent = cent.copy()
+        filled = counts > 0
+        new_cent[filled] = sums[filled] / counts[filled, np.newaxis]
         if np.all(cent == new_cent):
             break
         cent = new_cent
-    wcss = 0
-    for i in range(k):
-        pts = data[labels == i]
-        if len(pts) > 0:
-            wcss += np.sum((pts - cent[i])**2)
-    return wcss
+    return cent, wcss_of(data, cent, labels), n_iter
+
+def hamerly(data, cent, x_sq):
+    # Hamerly's k-means: an upper bound on each point's distance to its centroid and a
+    # lower bound on the runner-up skip the search wherever upper <= max(lower, s/2)
+    n, k = len(data), len(cent)
+    labels, upper, lower = nearest_two(data, np.arange(n), cent, x_sq)
+    counts = np.bincount(labels, minlength=k).astype(np.float64)
+    sums = np.zeros((k, data.shape[1]))
+    step = chunk_rows(k + data.shape[1])
+    for s in range(0, n, step):
+        lab = labels[s:s + step]
+        onehot = np.zeros((len(lab), k))
+        onehot[np.arange(len(lab)), lab] = 1
+        sums += onehot.T @ np.asarray(data[s:s + step], dtype=np.float64)
+    for n_iter in range(1, MAX_ITER + 1):
+        new_cent = cent.copy()
+        filled = counts > 0
+        new_cent[filled] = sums[filled] / counts[filled, np.newaxis]
+        if np.all(cent == new_cent):
+            break
+        drift = np.sqrt(((new_cent - cent)**2).sum(axis=1))
+        cent = new_cent
+        upper += drift[labels]
+        if k > 1:
+            far = np.argsort(drift)[-2:]
+            # every other centroid moved at most the largest drift not belonging to the point's own
+            lower -= np.where(labels == far[1], drift[far[0]], drift[far[1]])
+            gap = np.sqrt(np.maximum(((cent[:, np.newaxis] - cent)**2).sum(axis=2), 0))
+            np.fill_diagonal(gap, np.inf)
+            bound = np.maximum(gap.min(axis=1)[labels] / 2, lower)
+        else:
+            bound = np.full(n, np.inf)
+        rows = np.flatnonzero(upper > bound)
+        # tighten the upper bound first; only points still in doubt get a full search
+        for s in range(0, len(rows), step):
+            r = rows[s:s + step]
+            diff = np.asarray(data[r], dtype=np.float64) - cent[labels[r]]
+            upper[r] = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        rows = rows[upper[rows] > bound[rows]]
+        if len(rows) == 0:
+            continue
+        new_labels, upper[rows], lower[rows] = nearest_two(data, rows, cent, x_sq)
+        moved = new_labels != labels[rows]
+        rows, old, new = rows[moved], labels[rows][moved], new_labels[moved]
+        for s in range(0, len(rows), step):
+            x = np.asarray(data[rows[s:s + step]], dtype=np.float64)
+            np.add.at(sums, old[s:s + step], -x)
+            np.add.at(sums, new[s:s + step], x)
+        counts += np.bincount(new, minlength=k) - np.bincount(old, minlength=k)
+        labels[rows] = new
+    return cent, labels, n_iter
+
+def split_worst(data, cent, cluster_wcss):
+    # k+1 start centroids: the cluster with the highest WCSS is replaced by two points one
+    # standard deviation either side of its centroid, along its principal axis
+    j = int(np.argmax(cluster_wcss))
+    d = data.shape[1]
+    scatter = np.zeros((d, d))
+    count = 0
+    step = chunk_rows(len(cent) + d)
+    for s in range(0, len(data), step):
+        x = np.asarray(data[s:s + step], dtype=np.float64)
+        labels, _, _ = nearest_two(x, np.arange(len(x)), cent, np.einsum('ij,ij->i', x, x))
+        diff = x[labels == j] - cent[j]
+        scatter += diff.T @ diff
+        count += len(diff)
+    vals, vecs = np.linalg.eigh(scatter / max(count, 1))
+    offset = np.sqrt(max(vals[-1], 0.0)) * vecs[:, -1]
+    new_cent = np.vstack([cent, cent[j] + offset])
+    new_cent[j] -= offset
+    return new_cent
+
+_DATA = None     # the dataset inside a sweep worker
+_BLOCKS = []
+
+def share_array(arr, blocks):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    blocks.append(shm)
+    return shm.name, arr.shape, arr.dtype.str
+
+def _init_worker(spec):
+    global _DATA
+    np.random.seed()    # forked workers would all continue the parent's stream: same restarts
+    kind, *rest = spec
+    if kind == 'mmap':
+        _DATA = np.load(rest[0], mmap_mode='r')     # memory-mapped inputs are shared by the page cache
+    else:
+        name, shape, dtype = rest
+        shm = shared_memory.SharedMemory(name=name)
+        _BLOCKS.append(shm)
+        _DATA = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def fit_seed(seed, k, restart):
+    # one stream per (k, restart), so a seeded sweep does not depend on the worker count
+    return int(np.random.SeedSequence([seed, k, restart]).generate_state(1)[0])
+
+def _sweep_task(task):
+    # cold: (ks, restart) with one k; warm: a chain over all ks, each k started from k-1
+    ks, restart, seed, warm, fit_args = task
+    costs, cent, cluster_wcss = [], None, None
+    for k in ks:
+        if seed is not None:
+            np.random.seed(fit_seed(seed, k, restart))
+        start = split_worst(_DATA, cent, cluster_wcss) if warm and cent is not None else None
+        cent, cluster_wcss, _ = fit_kmeans(_DATA, k, *fit_args, cent=start)
+        costs.append(cluster_wcss.sum())
+    return costs
+
+@contextmanager
+def sweep_pool(X, workers):
+    # a map over sweep tasks, run in-process or on a pool sharing X
+    global _DATA
+    if not workers:
+        _DATA = X
+        yield lambda tasks: [_sweep_task(task) for task in tasks]
+        return
+    blocks = []
+    spec = ('mmap', X.filename) if isinstance(X, np.memmap) else ('shm',) + share_array(X, blocks)
+    try:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(spec,)) as pool:
+            yield lambda tasks: pool.map(_sweep_task, tasks, chunksize=1)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def elbow_costs(X, ks, restarts, fit_args, workers=0, seed=None, warm=False):
+    # best WCSS per k over the restarts
+    if warm:
+        tasks = [(list(ks), r, seed, True, fit_args) for r in range(restarts)]
+    else:
+        # largest k first: the pool then finishes on short fits
+        tasks = [([k], r, seed, False, fit_args) for k in reversed(ks) for r in range(restarts)]
+    with sweep_pool(X, workers) as run:
+        results = run(tasks)
+    best = {}
+    for (task_ks, *_), costs in zip(tasks, results):
+        for k, cost in zip(task_ks, costs):
+            best[k] = min(best.get(k, np.inf), cost)
+    return [best[k] for k in ks]
+
+def elbow_k(ks, costs):
+    # k of the largest second difference of the WCSS curve (1 with fewer than three points)
+    if len(costs) < 3:
+        return ks[0], None
+    curve = [2 * ((costs[i + 1] - costs[i]) / (ks[i + 1] - ks[i])
+                  - (costs[i] - costs[i - 1]) / (ks[i] - ks[i - 1])) / (ks[i + 1] - ks[i - 1])
+             for i in range(1, len(ks) - 1)]
+    j = int(np.argmax(curve)) + 1
+    return ks[j], j
+
+ADAPT_GROWTH = 1.5   # ratio between neighbouring k of the coarse grid
+ADAPT_SPREAD = 0.01  # relative spread between restarts above which a k near the knee gets more
+
+def coarse_ks(kmax):
+    ks, k = {1, 2, 3, kmax}, 4
+    while k < kmax:
+        ks.add(k)
+        k = int(np.ceil(k * ADAPT_GROWTH))
+    return sorted(k for k in ks if k <= kmax)
+
+def adaptive_elbow(X, kmax, restarts, fit_args, workers=0, seed=None):
+    # fits a geometric grid of k, then bisects gaps of the grid while they could still hide a
+    # larger second difference than the best one found between adjacent k; restarts go only
+    # to the k around that best point whose fits disagree
+    runs = {}
+    first = min(2, restarts)
+    with sweep_pool(X, workers) as run:
+        pairs = [(k, r) for k in reversed(coarse_ks(kmax)) for r in range(first)]
+        while pairs:
+            for (k, _), (cost,) in zip(pairs, run([([k], r, seed, False, fit_args) for k, r in pairs])):
+                runs.setdefault(k, []).append(cost)
+            ks = sorted(runs)
+            costs = [min(runs[k]) for k in ks]
+            if len(ks) < 3:
+                return ks, costs, ks[0]
+            slopes = np.diff(costs) / np.diff(ks)
+            exact = [(slopes[i] - slopes[i - 1], ks[i]) for i in range(1, len(ks) - 1)
+                     if ks[i + 1] - ks[i - 1] == 2]
+            best, best_k = max(exact, key=lambda e: (e[0], -e[1])) if exact else (-np.inf, None)
+            # on a convex curve no k inside gap i bends more than the slopes either side differ
+            gaps = [(slopes[min(i + 1, len(slopes) - 1)] - slopes[max(i - 1, 0)], i)
+                    for i in range(len(slopes)) if ks[i + 1] - ks[i] > 1]
+            bound, i = max(gaps) if gaps else (-np.inf, None)
+            pairs = []
+            if bound > best:
+                pairs = [((ks[i] + ks[i + 1]) // 2, r) for r in range(first)]
+            elif best_k is not None:
+                pairs = [(k, len(runs[k])) for k in (best_k - 1, best_k, best_k + 1)
+                         if len(runs[k]) < restarts and
+                         max(runs[k]) - min(runs[k]) > ADAPT_SPREAD * min(runs[k])]
+    return ks, costs, best_k
+
+ALGOS = ('lloyd', 'hamerly', 'minibatch')
+ORDERS = ('random', 'sequential')
+INITS = ('random', 'kmeans++')
+
+def parse_args(argv):
+    positional, options = [], {}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg.startswith('--'):
+            name, eq, value = arg[2:].partition('=')
+            if not eq:
+                if i + 1 < len(argv) and not argv[i + 1].startswith('--'):
+                    value = argv[i + 1]
+                    i += 1
+                else:
+                    value = True
+            options[name] = value
+        else:
+            positional.append(arg)
+        i += 1
+    return positional, options
 
 def main():
-    if len(sys.argv) != 2:
+    args, options = parse_args(sys.argv[1:])
+    algo = options.get('algo', 'lloyd')
+    init = options.get('init', 'random')
+    order = options.get('batch-order', 'random')
+    if len(args) != 1 or algo not in ALGOS or init not in INITS or order not in ORDERS:
+        print("Usage: python3 Q1.py <dataset> [--algo lloyd|hamerly|minibatch] "
+              "[--init random|kmeans++] [--restarts N] [--batch N] [--batch-order random|sequential] "
+              "[--workers N] [--seed N] [--warm] [--cache-dir DIR] [--cache-mb MB] [--no-cache] "
+              "[--url-base URL] [--kmax K] [--adaptive]",
+              file=sys.stderr)
         return
-    source_dataset = sys.argv[1]
-    X = load_data(source_dataset)
+    source_dataset = args[0]
+    restarts = int(options.get('restarts', 3))
+    batch = int(options.get('batch', MB_BATCH))
+    workers = int(options.get('workers', 0))
+    seed = int(options['seed']) if 'seed' in options else None
+    cache_dir = None if 'no-cache' in options else options.get('cache-dir', CACHE_DIR)
+    X = load_data(source_dataset, mmap=algo == 'minibatch', cache_dir=cache_dir,
+                  cache_mb=float(options.get('cache-mb', CACHE_MB)),
+                  url_base=options.get('url-base', DATASET_URL))
     # print({X.shape})
     # print(X[:5])
 
-    ks = range(1, 16) 
-    costs = []
-    for k in ks:
-        best_for_k = min([run_kmeans(X, k) for _ in range(3)])
-        costs.append(best_for_k)
-    best_k = 1
-    if len(costs) > 2:
-        slopes = np.diff(costs)
-        acceleration = np.diff(slopes)
-        best_k = ks[np.argmax(acceleration) + 1]
-    
+    kmax = int(options.get('kmax', 15))
+    fit_args = (algo, init, batch, order)
+    if 'adaptive' in options:
+        ks, costs, best_k = adaptive_elbow(X, kmax, restarts, fit_args, workers, seed)
+    else:
+        ks = list(range(1, kmax + 1))
+        costs = elbow_costs(X, ks, restarts, fit_args, workers, seed, 'warm' in options)
+        best_k, _ = elbow_k(ks, costs)
+
     fig, ax = plt.subplots(figsize=(10, 6))
     ax.plot(ks, costs, 'b-o', label='WCSS curve')
-    ax.plot(best_k, costs[best_k-1], 'ro', markersize=10, label=f'Optimal k={best_k}')
+    ax.plot(best_k, costs[ks.index(best_k)], 'ro', markersize=10, label=f'Optimal k={best_k}')
     ax.set_xlabel('Number of Clusters (k)')
     ax.set_ylabel('Objective Value (WCSS)')
     ax.set_title(f'K-means Elbow Analysis for Dataset {source_dataset}')
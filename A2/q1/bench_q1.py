@@ -0,0 +1,210 @@
+import sys
+import os
+import csv
+import time
+import itertools
+import subprocess
+import tracemalloc
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from Q1 import parse_args, fit_kmeans
+
+# ── Synthetic data ──────────────────────────────────────────────────────────────
+
+BLOB_STD = 1.0       # spread of every blob
+CENTER_BOX = 10.0    # blob centres are drawn uniformly from [-CENTER_BOX, CENTER_BOX]^d
+
+
+def make_blobs(n, d, k, workdir):
+    """Write n points in k Gaussian blobs of dimension d as .npy; returns the path."""
+    path = os.path.join(workdir, f"blobs_{n}_{d}_{k}.npy")
+    if not os.path.exists(path):
+        rng = np.random.default_rng([n, d, k])
+        centers = rng.uniform(-CENTER_BOX, CENTER_BOX, (k, d))
+        X = centers[rng.integers(0, k, n)] + rng.normal(0, BLOB_STD, (n, d))
+        np.save(path, X)
+    return path
+
+# ── Runs ────────────────────────────────────────────────────────────────────────
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Q1.py')
+
+FIELDS = ['commit', 'n', 'd', 'k', 'algo', 'init', 'status', 'fit_s', 'iterations', 'wcss',
+          'peak_mb', 'sweep_s', 'best_k', 'correct']
+
+
+def time_fit(cfg, X):
+    """One fit at the true k: wall time without tracing, then peak memory with tracemalloc."""
+    args = (cfg['algo'], cfg['init'])
+    np.random.seed(0)
+    start = time.perf_counter()
+    _, cluster_wcss, n_iter = fit_kmeans(X, cfg['k'], *args)
+    fit_s = time.perf_counter() - start
+    np.random.seed(0)
+    tracemalloc.start()
+    fit_kmeans(X, cfg['k'], *args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dict(fit_s=round(fit_s, 4), iterations=n_iter, wcss=float(cluster_wcss.sum()),
+                peak_mb=round(peak / 2**20, 2))
+
+
+def run_sweep(cfg, data_path, workdir, extra, timeout):
+    """Run Q1.py's elbow sweep on the dataset; returns (seconds, best_k) or a failure status."""
+    cmd = [sys.executable, SCRIPT, os.path.abspath(data_path), '--algo', cfg['algo'],
+           '--init', cfg['init'], '--seed', '0'] + extra
+    print(f"  Command: {' '.join(cmd)}", flush=True)
+    start = time.perf_counter()
+    try:
+        # cwd: Q1.py writes plot.png next to where it runs
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                timeout=timeout, universal_newlines=True, cwd=workdir)
+    except subprocess.TimeoutExpired:
+        print("    TIMEOUT", flush=True)
+        return 'timeout', timeout, None
+    seconds = round(time.perf_counter() - start, 4)
+    lines = result.stdout.split()
+    if result.returncode != 0 or not lines:
+        print(f"    FAILED: {result.stderr.strip()[-500:]}", flush=True)
+        return 'error', seconds, None
+    return 'ok', seconds, int(lines[-1])
+
+
+def run_dataset(n, d, k, methods, workdir, extra, timeout, sweep):
+    """Every method on one blob dataset; returns one row per (algo, init)."""
+    path = make_blobs(n, d, k, workdir)
+    rows = []
+    for algo, init in methods:
+        cfg = dict(n=n, d=d, k=k, algo=algo, init=init)
+        print(f"  {algo} / {init}", flush=True)
+        # minibatch reads the file through a memory map, as Q1.py does for it
+        X = np.load(path, mmap_mode='r' if algo == 'minibatch' else None)
+        row = dict(cfg, status='ok', **time_fit(cfg, X))
+        print(f"    fit {row['fit_s']}s, {row['iterations']} iterations, peak {row['peak_mb']} MB",
+              flush=True)
+        if sweep:
+            status, seconds, best_k = run_sweep(cfg, path, workdir, extra, timeout)
+            row.update(status=status, sweep_s=seconds, best_k=best_k)
+            row['correct'] = row['best_k'] == k
+            print(f"    sweep {row['sweep_s']}s, best_k {row['best_k']} (true {k})", flush=True)
+        rows.append(row)
+    return rows
+
+
+def dataset_grid(ns, ds, ks, full):
+    """(n, d, k) triples: the whole grid, or the first values with one axis varied at a time."""
+    if full:
+        return list(itertools.product(ns, ds, ks))
+    n0, d0, k0 = ns[0], ds[0], ks[0]
+    return ([(n0, d0, k0)] + [(n, d0, k0) for n in ns[1:]] + [(n0, d, k0) for d in ds[1:]]
+            + [(n0, d0, k) for k in ks[1:]])
+
+
+def code_version():
+    """Short commit of the checkout, marked -dirty when timing uncommitted edits to Q1.py."""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty', '--abbrev=7'],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True, cwd=os.path.dirname(SCRIPT)).stdout.strip()
+    except OSError:
+        return ''
+
+
+def append_rows(path, rows):
+    """Append rows to the results CSV, writing the header if the file is new."""
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+# ── Summary plot ────────────────────────────────────────────────────────────────
+
+def plot_summary(rows, plot_path):
+    """This run only: fit time against N at the base d and k, and the share of sweeps
+    that found the true k, per method."""
+    rows = [r for r in rows if r['status'] == 'ok']
+    if not rows:
+        return
+    methods = sorted({(r['algo'], r['init']) for r in rows})
+    d0, k0 = rows[0]['d'], rows[0]['k']
+    fig, (ax_time, ax_acc) = plt.subplots(1, 2, figsize=(14, 6))
+    for algo, init in methods:
+        line = sorted((r['n'], r['fit_s']) for r in rows
+                      if (r['algo'], r['init']) == (algo, init) and (r['d'], r['k']) == (d0, k0))
+        ax_time.plot(*zip(*line), '-o', label=f"{algo} / {init}")
+    ax_time.set_xscale('log')
+    ax_time.set_yscale('log')
+    ax_time.set_xlabel('N')
+    ax_time.set_ylabel(f'Fit time at the true k (s), d={d0}, k={k0}')
+    ax_time.legend()
+    ax_time.grid(True)
+
+    swept = [r for r in rows if r.get('best_k') is not None]
+    if swept:
+        acc = [np.mean([r['correct'] for r in swept if (r['algo'], r['init']) == m] or [0.0])
+               for m in methods]
+        ax_acc.bar([f"{a}\n{i}" for a, i in methods], acc)
+    ax_acc.set_ylim(0, 1)
+    ax_acc.set_ylabel('Sweeps with best_k = true k')
+    ax_acc.grid(True, axis='y')
+    fig.tight_layout()
+    fig.savefig(plot_path)
+
+# ── Entry point ─────────────────────────────────────────────────────────────────
+
+USAGE = ("Usage: python3 bench_q1.py [--out results.csv] [--plot summary.png] [--workdir DIR] "
+         "[--n 10000,...] [--d 2,...] [--k 3,...] [--algo lloyd,...] [--init random,...] "
+         "[--full] [--no-sweep] [--timeout SEC] [--pass=\"--workers 4 ...\"]")
+
+DEFAULTS = {
+    'n':    '20000,100000,500000',   # datasets vary one of n, d, k around the first values
+    'd':    '8,2,64',
+    'k':    '5,3,10',
+    'algo': 'lloyd,hamerly,minibatch',   # every method runs on every dataset
+    'init': 'random,kmeans++',
+}
+
+
+def main():
+    args, options = parse_args(sys.argv[1:])
+    if args or 'help' in options:
+        print(USAGE)
+        sys.exit(1)
+
+    lists = {name: str(options.get(name, default)).split(',') for name, default in DEFAULTS.items()}
+    ns, ds, ks = ([int(x) for x in lists[name]] for name in ('n', 'd', 'k'))
+    methods = list(itertools.product(lists['algo'], lists['init']))
+
+    out_path  = options.get('out', 'bench_q1.csv')
+    plot_path = options.get('plot', 'bench_q1.png')
+    workdir   = options.get('workdir', 'bench_data')
+    timeout   = int(options.get('timeout', 1800))
+    extra     = str(options['pass']).split() if 'pass' in options else []
+    os.makedirs(workdir, exist_ok=True)
+
+    version  = code_version()
+    datasets = dataset_grid(ns, ds, ks, 'full' in options)
+    print(f"[INFO] {len(datasets)} datasets x {len(methods)} methods, code {version or '?'}, "
+          f"results -> {out_path}", flush=True)
+
+    rows = []
+    for i, (n, d, k) in enumerate(datasets, 1):
+        print(f"[{i}/{len(datasets)}] n={n} d={d} k={k}", flush=True)
+        done = run_dataset(n, d, k, methods, workdir, extra, timeout, 'no-sweep' not in options)
+        for row in done:
+            row['commit'] = version
+        append_rows(out_path, done)    # per dataset, so an interrupted run keeps what finished
+        rows += done
+    plot_summary(rows, plot_path)
+    print(f"[INFO] Summary plot written to {plot_path}", flush=True)
+    print("[INFO] Done.", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+import Q1
+
+DOC = {"id": 7, "X": [[1.5, -2.0, 3e-3], [4.0, 5.25, -6.0], [0.0, 1e5, 7.125]], "y": [0, 1]}
+
+
+@pytest.mark.parametrize('chunk', range(1, 48))
+def test_parse_json_x_any_chunk_boundary(monkeypatch, chunk):
+    # small chunks put every bracket, comma and digit of the "X" array on a chunk boundary
+    monkeypatch.setattr(Q1, 'JSON_CHUNK', chunk)
+    text = json.dumps(DOC).encode()
+    expected = np.array(DOC['X'])
+    assert Q1.json_x_shape(io.BytesIO(text)) == expected.shape
+    np.testing.assert_array_equal(Q1.parse_json_x(io.BytesIO(text)), expected)
+    np.testing.assert_array_equal(Q1.parse_json_x(io.BytesIO(text), expected.shape), expected)
+
+
+def test_parse_json_x_bracket_ends_chunk(monkeypatch):
+    text = json.dumps(DOC).encode()
+    monkeypatch.setattr(Q1, 'JSON_CHUNK', text.index(b'[') + 1)
+    np.testing.assert_array_equal(Q1.parse_json_x(io.BytesIO(text)), np.array(DOC['X']))
+
+
+def test_parse_json_x_truncated(monkeypatch):
+    monkeypatch.setattr(Q1, 'JSON_CHUNK', 8)
+    text = json.dumps(DOC).encode()
+    with pytest.raises(ValueError):
+        list(Q1.json_x_segments(io.BytesIO(text[:text.index(b']]')])))
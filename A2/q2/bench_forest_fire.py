@@ -0,0 +1,229 @@
+import sys
+import os
+import csv
+import json
+import time
+import itertools
+import subprocess
+
+import numpy as np
+
+from forest_fire import parse_args
+
+# ── Synthetic graphs ────────────────────────────────────────────────────────────
+
+AVG_DEGREE = 5          # out-degree of the non-grid generators
+
+
+def powerlaw_edges(m, rng, gamma=2.5):
+    """Chung-Lu style graph: endpoints drawn with weights ~ rank^(-1/(gamma-1))."""
+    n = max(2, m // AVG_DEGREE)
+    w = np.arange(1, n + 1, dtype=np.float64) ** (-1.0 / (gamma - 1.0))
+    w /= w.sum()
+    return rng.choice(n, m, p=w), rng.choice(n, m, p=w), n
+
+
+def er_edges(m, rng):
+    n = max(2, m // AVG_DEGREE)
+    return rng.integers(0, n, m), rng.integers(0, n, m), n
+
+
+def grid_edges(m, rng):
+    """Square lattice with both directions of every neighbour pair (about 4 edges per node)."""
+    side = max(2, int(round((m / 4) ** 0.5)))
+    idx  = np.arange(side * side).reshape(side, side)
+    right = np.stack([idx[:, :-1].ravel(), idx[:, 1:].ravel()])
+    down  = np.stack([idx[:-1, :].ravel(), idx[1:, :].ravel()])
+    pairs = np.concatenate([right, down], axis=1)
+    us = np.concatenate([pairs[0], pairs[1]])
+    vs = np.concatenate([pairs[1], pairs[0]])
+    return us, vs, side * side
+
+
+def community_edges(m, rng, n_comm=20, p_in=0.9):
+    """Planted partition: a fraction p_in of the edges stays inside a community."""
+    n = max(n_comm, m // AVG_DEGREE)
+    us = rng.integers(0, n, m)
+    comm = us % n_comm
+    inside = rng.random(m) < p_in
+    vs = rng.integers(0, n, m)
+    size = n // n_comm
+    vs[inside] = comm[inside] + n_comm * rng.integers(0, size, int(inside.sum()))
+    return us, vs, n
+
+
+GENERATORS = {
+    'powerlaw':  powerlaw_edges,
+    'er':        er_edges,
+    'grid':      grid_edges,
+    'community': community_edges,
+}
+
+
+def make_graph(kind, m, pmin, pmax, workdir):
+    """Write a synthetic graph with about m edges; returns (path, number of nodes)."""
+    path = os.path.join(workdir, f"{kind}_{m}_{pmin}_{pmax}.txt")
+    rng  = np.random.default_rng([m, list(GENERATORS).index(kind)])
+    us, vs, n = GENERATORS[kind](m, rng)
+    keep = us != vs
+    us, vs = us[keep], vs[keep]
+    ps = rng.uniform(pmin, pmax, len(us))
+    if not os.path.exists(path):
+        with open(path, 'w') as f:
+            for u, v, p in zip(us.tolist(), vs.tolist(), ps.tolist()):
+                f.write(f"{u} {v} {p:.4f}\n")
+    return path, n
+
+
+def make_seeds(graph_path, n_nodes, n_seeds):
+    path = f"{graph_path}.seeds{n_seeds}"
+    if not os.path.exists(path):
+        rng = np.random.default_rng([n_nodes, n_seeds])
+        with open(path, 'w') as f:
+            for s in rng.choice(n_nodes, min(n_seeds, n_nodes), replace=False).tolist():
+                f.write(f"{s}\n")
+    return path
+
+# ── Runs ────────────────────────────────────────────────────────────────────────
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'forest_fire.py')
+
+FIELDS = ['commit', 'graph', 'm', 'n_nodes', 'n_edges', 'n_sim', 'k', 'hops', 'n_seeds', 'engine',
+          'status', 'total_s', 'load_graph_s', 'hop_ball_s', 'prefilter_s', 'engine_setup_s',
+          'warm_start_s', 'rounds_s', 'round_times_s', 'n_candidates', 'simulations',
+          'sims_per_sec', 'sigma_empty', 'sigma_final', 'reduction_ratio', 'max_rss_kb']
+
+
+def run_one(cfg, graph_path, seed_path, workdir, extra, timeout):
+    """Run forest_fire.py once with --profile and flatten its profile into a CSV row."""
+    out  = os.path.join(workdir, 'out.txt')
+    prof = out + '.profile.json'
+    if os.path.exists(prof):
+        os.remove(prof)
+    cmd = [sys.executable, SCRIPT, graph_path, seed_path, out, str(cfg['k']), str(cfg['n_sim']),
+           str(cfg['hops']), '--engine', cfg['engine'], '--seed', '0', '--profile',
+           '--no-cache'] + extra   # load_graph_s always times the text parse, not a .csr.npz hit
+    print(f"  Command: {' '.join(cmd)}", flush=True)
+
+    row = dict(cfg)
+    start = time.time()
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                timeout=timeout, universal_newlines=True)
+    except subprocess.TimeoutExpired:
+        print("    TIMEOUT", flush=True)
+        row.update(status='timeout', total_s=timeout)
+        return row
+    row['total_s'] = round(time.time() - start, 4)
+    if result.returncode != 0 or not os.path.exists(prof):
+        print(f"    FAILED: {result.stderr.strip()[-500:]}", flush=True)
+        row['status'] = 'error'
+        return row
+
+    with open(prof) as f:
+        p = json.load(f)
+    phases, counters = p['phases'], p['counters']
+    row.update(
+        status='ok',
+        n_nodes=p['n_nodes'], n_edges=p['n_edges'], n_candidates=p['n_candidates'],
+        simulations=counters.get('simulations', 0),
+        sims_per_sec=round(p['simulations_per_second'] or 0, 1),
+        round_times_s=';'.join(f"{r['seconds']:.4f}" for r in p['rounds']),
+        sigma_empty=p['sigma_empty'], sigma_final=p['sigma_final'],
+        reduction_ratio=round(p['reduction_ratio'], 4),
+        max_rss_kb=p['max_rss_kb'])
+    for name in ('load_graph', 'hop_ball', 'prefilter', 'engine_setup', 'warm_start', 'rounds'):
+        row[name + '_s'] = round(phases.get(name, 0.0), 4)
+    print(f"    {row['total_s']}s, warm-start {row['warm_start_s']}s, "
+          f"reduction {row['reduction_ratio']}", flush=True)
+    return row
+
+
+def sweep_configs(base, sweeps, full):
+    """Every combination when ``full``, else each swept value with the rest at the base values."""
+    if full:
+        names = list(sweeps)
+        for values in itertools.product(*(sweeps[n] for n in names)):
+            yield dict(base, **dict(zip(names, values)))
+        return
+    seen = set()
+    for name, values in sweeps.items():
+        for value in values:
+            cfg = dict(base, **{name: value})
+            key = tuple(sorted(cfg.items()))
+            if key not in seen:
+                seen.add(key)
+                yield cfg
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True,
+                              cwd=os.path.dirname(SCRIPT)).stdout.strip()
+    except OSError:
+        return ''
+
+# ── Entry point ─────────────────────────────────────────────────────────────────
+
+USAGE = ("Usage: python3 bench_forest_fire.py [--out results.csv] [--workdir DIR] "
+         "[--graphs powerlaw,er,grid,community] [--edges 10000,...] [--nsim 100,...] [--k 5,...] "
+         "[--hops -1,...] [--seeds 10,...] [--engine batch,...] [--pmin P] [--pmax P] "
+         "[--full] [--timeout SEC] [--pass=\"--workers 4 ...\"]")
+
+# First value of each list is the base configuration
+DEFAULTS = {
+    'graph':   'powerlaw,er,grid,community',
+    'm':       '10000,40000',
+    'n_sim':   '100,300',
+    'k':       '5,10',
+    'hops':    '-1,3',
+    'n_seeds': '10,50',
+    'engine':  'worlds',
+}
+
+OPTION_NAMES = {'graphs': 'graph', 'edges': 'm', 'nsim': 'n_sim', 'k': 'k', 'hops': 'hops',
+                'seeds': 'n_seeds', 'engine': 'engine'}
+
+
+def main():
+    args, options = parse_args(sys.argv[1:])
+    if args or 'help' in options:
+        print(USAGE)
+        sys.exit(1)
+
+    sweeps = {}
+    for opt, name in OPTION_NAMES.items():
+        values = str(options.get(opt, DEFAULTS[name])).split(',')
+        sweeps[name] = values if name in ('graph', 'engine') else [int(x) for x in values]
+    base = {name: values[0] for name, values in sweeps.items()}
+
+    out_path = options.get('out', 'bench_forest_fire.csv')
+    workdir  = options.get('workdir', 'bench_data')
+    pmin, pmax = float(options.get('pmin', 0.05)), float(options.get('pmax', 0.3))
+    timeout  = int(options.get('timeout', 600))
+    extra    = str(options['pass']).split() if 'pass' in options else []
+    os.makedirs(workdir, exist_ok=True)
+
+    commit  = git_commit()
+    configs = list(sweep_configs(base, sweeps, 'full' in options))
+    print(f"[INFO] {len(configs)} runs, commit {commit or '?'}, results -> {out_path}", flush=True)
+
+    new_file = not os.path.exists(out_path)
+    with open(out_path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+        for i, cfg in enumerate(configs, 1):
+            print(f"[{i}/{len(configs)}] {cfg}", flush=True)
+            graph_path, n_nodes = make_graph(cfg['graph'], cfg['m'], pmin, pmax, workdir)
+            seed_path = make_seeds(graph_path, n_nodes, cfg['n_seeds'])
+            row = run_one(cfg, graph_path, seed_path, workdir, extra, timeout)
+            row['commit'] = commit
+            writer.writerow(row)
+            f.flush()
+    print("[INFO] Done.", flush=True)
+
+
+if __name__ == "__main__":
+    main()
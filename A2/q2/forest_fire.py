@@ -3,14 +3,59 @@ import os
 import heapq
 import random
 import time
-from collections import defaultdict, deque
+import json
+import pickle
+import resource
+import socketserver
+import struct
+import zipfile
+import multiprocessing
+from array import array
+from contextlib import contextmanager, redirect_stdout
+from multiprocessing import shared_memory
+from collections import OrderedDict, defaultdict, deque
+from statistics import NormalDist
+
+import numpy as np
 
 # ── I/O helpers ────────────────────────────────────────────────────────────────
 
-def load_graph(path):
-    adj   = defaultdict(list)
-    edges = []
-    probs = {}
+CACHE_VERSION = 1
+
+
+def load_graph(path, use_cache=True):
+    """Load the edge list at ``path`` as a CSRGraph.
+
+    The arrays are cached next to the input as ``<path>.csr.npz``, keyed on the
+    file's size and mtime; a valid cache is memory-mapped instead of parsed.
+    """
+    st    = os.stat(path)
+    key   = np.array([CACHE_VERSION, st.st_size, st.st_mtime_ns], dtype=np.int64)
+    cache = path + '.csr.npz'
+    if use_cache:
+        try:
+            arrays = mmap_npz(cache)
+            if np.array_equal(arrays['key'], key):
+                return CSRGraph(arrays['nodes'], arrays['indptr'], arrays['indices'],
+                                arrays['probs'], arrays['eids'])
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            pass
+
+    graph = parse_graph(path)
+    if use_cache:
+        tmp = f"{cache}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez(f, key=key, nodes=graph.nodes, indptr=graph.indptr,
+                         indices=graph.indices, probs=graph.probs, eids=graph.eids)
+            os.replace(tmp, cache)
+        except OSError:
+            pass    # read-only input directory: just skip the cache
+    return graph
+
+
+def parse_graph(path):
+    us, vs, ps = array('q'), array('q'), array('d')
     with open(path) as f:
         for line in f:
             line = line.strip()
@@ -23,10 +68,34 @@ def load_graph(path):
                 u, v, p = int(parts[0]), int(parts[1]), 1.0
             else:
                 continue
-            adj[u].append((v, p))
-            edges.append((u, v))
-            probs[(u, v)] = p
-    return adj, edges, probs
+            us.append(u)
+            vs.append(v)
+            ps.append(p)
+    return csr_from_edges(np.frombuffer(us, dtype=np.int64), np.frombuffer(vs, dtype=np.int64),
+                          np.frombuffer(ps, dtype=np.float64))
+
+
+def mmap_npz(path):
+    """Memory-map every array stored uncompressed in an .npz archive."""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed")
+            f.seek(info.header_offset)
+            header = f.read(30)                          # local file header
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                raise ValueError(f"unsupported .npy format {version}")
+            arrays[info.filename[:-4]] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(),
+                                                   shape=shape, order='F' if fortran else 'C')
+    return arrays
 
 
 def load_seeds(path):
@@ -44,150 +113,2046 @@ def write_output(path, routes):
         for u, v in routes:
             f.write(f"{u} {v}\n")
 
+# ── Profiling ───────────────────────────────────────────────────────────────────
+
+class Profile:
+    """Hot-path counters and phase timers, written as JSON by ``--profile``.
+
+    Counting sites inside the simulators check ``enabled`` first, so a disabled
+    profile costs one attribute lookup per simulation.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.counts  = defaultdict(int)
+        self.phases  = defaultdict(float)
+        self.rounds  = []
+        self.info    = {}
+        self.start   = time.perf_counter()
+
+    def count(self, **amounts):
+        for name, n in amounts.items():
+            self.counts[name] += n
+
+    def take(self):
+        """Return the counters and reset them (used to ship worker counts home)."""
+        counts, self.counts = dict(self.counts), defaultdict(int)
+        return counts
+
+    def add_time(self, name, t0):
+        """Charge the time since perf_counter() value t0 to phase ``name``."""
+        self.phases[name] += time.perf_counter() - t0
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, t0)
+
+    def end_round(self, t0, **info):
+        """Record one greedy round that started at perf_counter() time t0."""
+        self.rounds.append(dict(info, seconds=time.perf_counter() - t0,
+                                counters_so_far=dict(self.counts), max_rss_kb=max_rss_kb()))
+
+    def write(self, path, **meta):
+        sims = self.counts.get('simulations', 0)
+        busy = self.phases.get('warm_start', 0.0) + self.phases.get('rounds', 0.0)
+        data = dict(meta, **self.info,
+                    wall_seconds=time.perf_counter() - self.start,
+                    phases=dict(self.phases),
+                    counters=dict(self.counts),
+                    simulations_per_second=sims / busy if busy > 0 else None,
+                    max_rss_kb=max_rss_kb(),
+                    max_rss_children_kb=resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+                    rounds=self.rounds)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+def max_rss_kb():
+    """Peak resident set size of this process so far (kilobytes on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+PROFILE = Profile()
+
+# ── CSR graph ───────────────────────────────────────────────────────────────────
+
+class CSRGraph:
+    """Out-edges grouped by source node as NumPy arrays (compressed sparse rows).
+
+    Nodes are renumbered 0..n-1 in increasing id order; ``nodes[i]`` is the
+    original id of node i. Edge i runs from ``src[i]`` to ``indices[i]`` with
+    probability ``probs[i]`` and was line ``eids[i]`` of the input.
+    """
+
+    def __init__(self, nodes, indptr, indices, probs, eids=None):
+        self.nodes   = nodes
+        self.indptr  = indptr
+        self.indices = indices
+        self.probs   = probs
+        self.eids    = eids if eids is not None else np.arange(len(indices), dtype=indptr.dtype)
+        self.src     = np.repeat(np.arange(len(nodes), dtype=indices.dtype), np.diff(indptr))
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    def find(self, x):
+        """Index of original node id x, or -1."""
+        i = int(np.searchsorted(self.nodes, x))
+        return i if i < len(self.nodes) and self.nodes[i] == x else -1
+
+    def node_indices(self, ids):
+        """Indices of the given original node ids; ids not in the graph are dropped."""
+        ids = np.unique(np.asarray(list(ids), dtype=np.int64))
+        idx = np.minimum(np.searchsorted(self.nodes, ids), max(len(self.nodes) - 1, 0))
+        return idx[self.nodes[idx] == ids] if len(self.nodes) else idx[:0]
+
+    def positions(self, edge_set):
+        """CSR positions of every (u, v) in edge_set, parallel edges included."""
+        pos = []
+        for u, v in edge_set:
+            i, j = self.find(u), self.find(v)
+            if i >= 0 and j >= 0:
+                a = int(self.indptr[i])
+                pos.extend((a + np.flatnonzero(self.indices[a:self.indptr[i + 1]] == j)).tolist())
+        return np.array(pos, dtype=np.int64)
+
+    def edge_list(self, mask=None):
+        """(u, v) tuples in input order, optionally only where ``mask`` is set."""
+        order = np.argsort(self.eids, kind='stable')
+        if mask is not None:
+            order = order[mask[order]]
+        return list(zip(self.nodes[self.src[order]].tolist(), self.nodes[self.indices[order]].tolist()))
+
+    def subgraph(self, edge_mask):
+        """CSRGraph over the edges where edge_mask is set (and the nodes they touch)."""
+        keep = np.flatnonzero(edge_mask)
+        sub  = csr_from_edges(self.nodes[self.src[keep]], self.nodes[self.indices[keep]],
+                              self.probs[keep])
+        sub.eids = self.eids[keep][sub.eids]
+        return sub
+
+    def adjacency(self):
+        """The ``{u: [(v, p), ...]}`` dict used by the pure-Python engine."""
+        adj = defaultdict(list)
+        us = self.nodes[self.src].tolist()
+        vs = self.nodes[self.indices].tolist()
+        for u, v, p in zip(us, vs, self.probs.tolist()):
+            adj[u].append((v, p))
+        return adj
+
+
+def csr_from_edges(us, vs, ps):
+    """CSRGraph over parallel arrays of edge tails, heads and probabilities."""
+    nodes, inv = np.unique(np.concatenate([us, vs]), return_inverse=True)
+    src, dst = inv[:len(us)], inv[len(us):]
+    order = np.argsort(src, kind='stable')         # keeps input order within each node
+    itype = np.int32 if max(len(nodes), len(us)) < 2**31 else np.int64
+    indptr = np.zeros(len(nodes) + 1, dtype=itype)
+    np.cumsum(np.bincount(src, minlength=len(nodes)), out=indptr[1:])
+    return CSRGraph(nodes, indptr, dst[order].astype(itype), ps[order].astype(np.float32),
+                    order.astype(itype))
+
+
+def frontier_edges(graph, frontier, is_open=None):
+    """CSR positions of the edges leaving ``frontier``, and the frontier row each leaves from."""
+    starts, ends = graph.indptr[frontier], graph.indptr[frontier + 1]
+    pos  = expand_ranges(starts, ends)
+    rows = np.repeat(np.arange(len(frontier)), ends - starts)
+    if is_open is not None:
+        keep = is_open[pos]
+        pos, rows = pos[keep], rows[keep]
+    return pos, rows
+
+
+def hop_ball(graph, seeds, hops):
+    """The part of the graph a fire limited to ``hops`` levels can ever use.
+
+    That is every edge leaving a node within hops-1 of the seeds; blocking
+    edges only lengthens paths, so no blocking set reaches beyond it either.
+    """
+    inner = bfs_reachable(graph, seeds, limit=hops - 1)
+    return graph.subgraph(inner[graph.src])
+
+
+def expand_ranges(starts, ends):
+    """Concatenation of range(starts[i], ends[i]) for all i, without a Python loop."""
+    counts = ends - starts
+    total  = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return np.arange(total, dtype=np.int64) + shift
+
 # ── Fire simulation ─────────────────────────────────────────────────────────────
 
 def simulate_once(adj, seeds, blocked_set, hops, probs):
-    burned    = set(seeds)
-    queue     = deque(seeds)
-    hop_dist  = {s: 0 for s in seeds}   # only used when hops != -1
+    if hops != -1:
+        return simulate_levels(adj, seeds, blocked_set, hops)
 
+    burned = set(seeds)
+    queue  = deque(seeds)
     while queue:
         u = queue.popleft()
-        d_u = hop_dist.get(u, 0) if hops != -1 else 0
-
         for (v, p) in adj[u]:
             if v in burned:
                 continue
             if (u, v) in blocked_set:
                 continue
-            if hops != -1 and d_u + 1 > hops:
-                continue
             if random.random() < p:
                 burned.add(v)
-                if hops != -1:
-                    hop_dist[v] = d_u + 1
                 queue.append(v)
 
+    if PROFILE.enabled:
+        PROFILE.count(simulations=1, edges_relaxed=sum(len(adj.get(u, ())) for u in burned))
     return len(burned)
 
 
-def estimate_sigma(adj, seeds, blocked_set, hops, probs, n_sim):
+def simulate_levels(adj, seeds, blocked_set, hops):
+    """Hop-limited fire: expand one BFS level at a time and stop after ``hops`` levels."""
+    burned   = set(seeds)
+    frontier = list(seeds)
+    for _ in range(hops):
+        if not frontier:
+            break
+        nxt = []
+        for u in frontier:
+            for (v, p) in adj[u]:
+                if v in burned:
+                    continue
+                if (u, v) in blocked_set:
+                    continue
+                if random.random() < p:
+                    burned.add(v)
+                    nxt.append(v)
+        frontier = nxt
+
+    if PROFILE.enabled:
+        expanded = burned.difference(frontier)     # the last level is never expanded
+        PROFILE.count(simulations=1, edges_relaxed=sum(len(adj.get(u, ())) for u in expanded))
+
+    return len(burned)
+
+
+def estimate_sigma(adj, seeds, blocked_set, hops, probs, n_sim, engine=None):
+    if engine is not None:
+        return engine.estimate(blocked_set, n_sim)
     total = 0
     for _ in range(n_sim):
         total += simulate_once(adj, seeds, blocked_set, hops, probs)
     return total / n_sim
 
+
+def sample_sigma(adj, seeds, blocked_set, hops, probs, start, stop, engine=None):
+    """Burned count of each sample start..stop-1 (fresh samples unless the engine stores worlds)."""
+    if engine is not None:
+        return engine.samples(blocked_set, start, stop)
+    return np.array([simulate_once(adj, seeds, blocked_set, hops, probs)
+                     for _ in range(stop - start)], dtype=np.float64)
+
+# ── Batched bitset engine ───────────────────────────────────────────────────────
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+COIN_BLOCK   = 1 << 22    # max (edge, sample) cells unpacked at once
+SAMPLE_BLOCK = 1 << 26    # max (sample, node) burned flags held at once by BatchEngine
+
+
+def n_words(n_sim):
+    return (n_sim + 63) // 64
+
+
+def pack_samples(bits):
+    """Pack a (rows, n_sim) bool array into (rows, n_words) uint64 bit rows."""
+    rows, n_sim = bits.shape
+    padded = np.zeros((rows, n_words(n_sim) * 64), dtype=bool)
+    padded[:, :n_sim] = bits
+    return np.packbits(padded, axis=1).view(np.uint64)
+
+
+def sample_mask(width, stop, start=0):
+    """A single packed row of ``width`` words with sample bits start..stop-1 set."""
+    bits = np.zeros((1, width * 64), dtype=bool)
+    bits[0, start:stop] = True
+    return pack_samples(bits)
+
+
+def popcount(words):
+    return int(_POPCOUNT[words.view(np.uint8)].sum())
+
+
+def column_counts(words, n_sim):
+    """Number of set bits in each of the first n_sim sample columns."""
+    rows   = words[words.any(axis=1)]
+    counts = np.zeros(words.shape[1] * 64, dtype=np.int64)
+    step   = max(1, COIN_BLOCK // len(counts))
+    for i in range(0, len(rows), step):
+        counts += np.unpackbits(rows[i:i + step].view(np.uint8), axis=1).sum(axis=0, dtype=np.int64)
+    return counts[:n_sim]
+
+
+class BatchEngine:
+    """Runs all n_sim fires at once over a CSRGraph.
+
+    Fresh fires are advanced one BFS level at a time over a flat frontier of
+    (sample, node) keys: every edge leaving the frontier gets its own coin
+    where its target has not burned in that sample yet. Per-level frontiers
+    are sparse in the samples (a node catches fire at different levels in
+    different samples), so keys cost work per tried edge, not per sample.
+
+    ``spread`` is the packed form used by the world store: a nodes x samples
+    bit matrix (64 samples per uint64 word, in np.packbits bit order) where
+    the live bits of every edge leaving the frontier are OR-ed into the targets.
+    """
+
+    stores_worlds = False    # True when sample j means the same world in every call
+
+    def __init__(self, graph, seeds, hops, rng=None):
+        self.graph     = graph
+        self.seeds     = graph.node_indices(seeds)
+        self.n_missing = len(set(seeds)) - len(self.seeds)   # seeds with no edges still burn
+        self.hops      = hops
+        self.rng       = rng if rng is not None else np.random.default_rng()
+
+    def estimate(self, blocked_set, n_sim):
+        return float(self.burn_counts(blocked_set, n_sim).mean()) + self.n_missing
+
+    def samples(self, blocked_set, start, stop):
+        return self.burn_counts(blocked_set, stop - start) + self.n_missing
+
+    def burn_counts(self, blocked_set, n_sim):
+        """Burned count of each of n_sim fresh fires, SAMPLE_BLOCK flags at a time."""
+        g = self.graph
+        is_open = np.ones(g.n_edges, dtype=bool)
+        is_open[g.positions(blocked_set)] = False
+
+        # key = sample << shift | node, so node and sample split without a division
+        shift  = max(1, int(g.n_nodes - 1).bit_length())
+        node_mask = (1 << shift) - 1
+        seeds  = np.unique(self.seeds)
+        counts = np.zeros(n_sim, dtype=np.int64)
+        group  = max(1, SAMPLE_BLOCK >> shift)
+        for s0 in range(0, n_sim, group):
+            m = min(group, n_sim - s0)
+            burned = np.zeros(m << shift, dtype=bool)
+            keys = ((np.arange(m, dtype=np.int64)[:, None] << shift) | seeds).ravel()
+            burned[keys] = True
+            counts[s0:s0 + m] += len(seeds)
+            if PROFILE.enabled:
+                PROFILE.count(simulations=m)
+
+            level = 0
+            while len(keys) and (self.hops == -1 or level < self.hops):
+                node = keys & node_mask
+                starts, ends = g.indptr[node], g.indptr[node + 1]
+                pos  = expand_ranges(starts, ends)
+                dst  = np.repeat(keys - node, ends - starts) | g.indices[pos]
+                live = is_open[pos] & ~burned[dst]
+                if PROFILE.enabled:
+                    PROFILE.count(edges_relaxed=int(live.sum()))
+                live &= self.rng.random(len(pos), dtype=np.float32) < g.probs[pos]
+                dst = np.sort(dst[live])
+                keys = dst[np.concatenate(([True], dst[1:] != dst[:-1]))] if len(dst) else dst
+                burned[keys] = True
+                counts[s0:s0 + m] += np.bincount(keys >> shift, minlength=m)
+                level += 1
+        return counts
+
+    def trial(self, pos, hit, cols=None):
+        """Flip the coin of edge ``pos[i]`` in every sample set in ``hit[i]``; keep the live ones."""
+        probs = self.graph.probs
+        step  = max(1, COIN_BLOCK // (hit.shape[1] * 64))
+        for i in range(0, len(pos), step):
+            block = hit[i:i + step]
+            cells = np.flatnonzero(block)                  # words holding a trial
+            bits  = np.unpackbits(block.ravel()[cells].view(np.uint8)).view(bool)
+            tries = np.flatnonzero(bits)
+            edge  = pos[i + cells[tries >> 6] // block.shape[1]]
+            bits[tries[self.rng.random(len(tries)) >= probs[edge]]] = False
+            block.ravel()[cells] = np.packbits(bits).view(np.uint64)
+        return hit
+
+    def spread(self, blocked_set, samples, cols=None):
+        """Burn from the seeds in every sample set in the packed row ``samples``.
+
+        ``cols`` optionally names the words of the full sample row that
+        ``samples`` holds, for engines whose samples are fixed worlds.
+        """
+        g = self.graph
+        is_open = np.ones(g.n_edges, dtype=bool)
+        is_open[g.positions(blocked_set)] = False
+
+        burned = np.zeros((g.n_nodes, samples.shape[1]), dtype=np.uint64)
+        burned[self.seeds] = samples
+        if PROFILE.enabled:
+            PROFILE.count(simulations=popcount(samples))
+        frontier, front_bits = self.seeds, burned[self.seeds]
+
+        level = 0
+        while len(frontier) and (self.hops == -1 or level < self.hops):
+            pos, rows = frontier_edges(g, frontier, is_open)
+            dst = g.indices[pos]
+            hit = front_bits[rows] & ~burned[dst]
+            if PROFILE.enabled:
+                PROFILE.count(edges_relaxed=popcount(hit))
+            act = hit.any(axis=1)
+            pos, dst = pos[act], dst[act]
+            hit = self.trial(pos, hit[act], cols)
+            act = hit.any(axis=1)
+            dst, hit = dst[act], hit[act]
+
+            order = np.argsort(dst, kind='stable')
+            dst, hit = dst[order], hit[order]
+            frontier, first = np.unique(dst, return_index=True)
+            front_bits = np.bitwise_or.reduceat(hit, first, axis=0) if len(first) else hit
+            burned[frontier] |= front_bits
+            level += 1
+
+        return burned
+
+# ── Live-edge world store ───────────────────────────────────────────────────────
+
+class WorldStore(BatchEngine):
+    """n_sim live-edge worlds sampled once and reused by every estimate.
+
+    Bit j of ``live[e]`` says whether edge e is live in world j, so a sigma
+    estimate is plain reachability from the seeds over the live edges: no
+    randomness after construction, and every candidate blocking set is scored
+    against the same worlds (common random numbers).
+    """
+
+    stores_worlds = True
+
+    def __init__(self, graph, seeds, hops, n_sim, rng=None, live=None):
+        super().__init__(graph, seeds, hops, rng)
+        self.n_sim = n_sim
+        if live is not None:                  # worlds sampled elsewhere (e.g. shared memory)
+            self.live = live
+            return
+        self.live = np.empty((graph.n_edges, n_words(n_sim)), dtype=np.uint64)
+        step = max(1, COIN_BLOCK // n_sim)
+        for i in range(0, graph.n_edges, step):
+            p = graph.probs[i:i + step, None]
+            self.live[i:i + step] = pack_samples(self.rng.random((len(p), n_sim)) < p)
+
+    def estimate(self, blocked_set, n_sim):
+        """Mean burned count over the first n_sim stored worlds."""
+        if n_sim > self.n_sim:
+            raise ValueError(f"world store holds {self.n_sim} worlds, {n_sim} requested")
+        if self.extends_base(blocked_set, n_sim):
+            return self.samples(blocked_set, 0, n_sim).mean()
+        burned = self.spread(blocked_set, sample_mask(self.live.shape[1], n_sim))
+        return popcount(burned) / n_sim + self.n_missing
+
+    def samples(self, blocked_set, start, stop):
+        """Burned count in each stored world start..stop-1."""
+        if self.extends_base(blocked_set, stop):
+            counts   = self.base[2].copy()    # only the affected worlds change
+            affected = self.affected(blocked_set) & sample_mask(self.live.shape[1], stop, start)
+            if affected.any():
+                cols, sub = self.resimulate(blocked_set, affected)
+                hit = np.unpackbits(affected[0, cols].view(np.uint8)).view(bool)
+                idx = (cols[:, None] * 64 + np.arange(64)).ravel()[hit]
+                counts[idx] = column_counts(sub, len(hit))[hit]
+            return counts[start:stop] + self.n_missing
+        burned = self.spread(blocked_set, sample_mask(self.live.shape[1], stop, start))
+        return column_counts(burned, stop)[start:] + self.n_missing
+
+    def trial(self, pos, hit, cols=None):
+        hit &= self.live[pos] if cols is None else self.live[pos[:, None], cols]
+        return hit
+
+    # Incremental re-simulation: ``base`` holds the burned matrix and per-world
+    # counts of the last committed blocking set. Blocking more edges can only
+    # change the worlds in which a newly blocked edge was traversed (tail
+    # burned, edge live), so only those worlds are simulated again.
+
+    base = None     # (blocked frozenset, burned matrix, per-world counts, n_sim)
+
+    def commit(self, blocked_set, n_sim):
+        """Make blocked_set the base that later estimates are computed against."""
+        if self.extends_base(blocked_set, n_sim) and self.base[3] == n_sim:
+            burned   = self.base[1].copy()
+            affected = self.affected(blocked_set)
+            if affected.any():
+                cols, sub = self.resimulate(blocked_set, affected)
+                burned[:, cols] = (burned[:, cols] & ~affected[:, cols]) | sub
+        else:
+            burned = self.spread(blocked_set, sample_mask(self.live.shape[1], n_sim))
+        counts = column_counts(burned, self.live.shape[1] * 64)
+        self.base = (frozenset(blocked_set), burned, counts, n_sim)
+
+    def extends_base(self, blocked_set, stop):
+        """True when worlds 0..stop-1 under blocked_set can be derived from the base."""
+        return self.base is not None and self.base[0] <= blocked_set and stop <= self.base[3]
+
+    def affected(self, blocked_set):
+        """Packed row of the worlds in which an edge of blocked_set outside the base was traversed."""
+        base_blocked, burned = self.base[:2]
+        g   = self.graph
+        pos = g.positions(set(blocked_set) - base_blocked)
+        pos = np.setdiff1d(pos, g.positions(base_blocked))
+        row = np.zeros((1, self.live.shape[1]), dtype=np.uint64)
+        if len(pos):
+            row[0] = np.bitwise_or.reduce(burned[g.src[pos]] & self.live[pos], axis=0)
+        return row
+
+    def resimulate(self, blocked_set, affected):
+        """Re-run only the affected worlds; returns the touched words and their burned bits."""
+        cols = np.flatnonzero(affected[0])
+        return cols, self.spread(blocked_set, affected[:, cols], cols)
+
+    def gain_bounds(self, blocked_set, edges, n_sim):
+        """Upper bound on the mean gain of adding each of ``edges`` to blocked_set.
+
+        Blocking (u, v) only unburns nodes whose every shortest path from the
+        seeds runs through (u, v), so in each world it unburns at most the
+        BFS-tree subtree under v, and only when u is v's tree parent. This
+        holds with and without a hop limit.
+        """
+        g = self.graph
+        is_open = np.ones(g.n_edges, dtype=bool)
+        is_open[g.positions(blocked_set)] = False
+        burned = self.spread(blocked_set, sample_mask(self.live.shape[1], n_sim)).view(np.uint8)
+        live   = self.live.view(np.uint8)
+
+        depth = np.full(g.n_nodes, -1, dtype=np.int64)
+        size  = np.zeros(g.n_nodes, dtype=np.int64)
+        pairs, sizes = [], []
+        for j in range(n_sim):
+            byte, shift = j >> 3, 7 - (j & 7)
+            is_burned = ((burned[:, byte] >> shift) & 1).astype(bool)
+            reached = np.flatnonzero(is_burned)
+            pos = expand_ranges(g.indptr[reached], g.indptr[reached + 1])
+            pos = pos[is_open[pos] & is_burned[g.indices[pos]]
+                      & ((live[pos, byte] >> shift) & 1).astype(bool)]
+            S, D = g.src[pos], g.indices[pos]          # grouped by S in increasing order
+
+            # BFS tree: each node's parent edge is the first live edge reaching it
+            depth[self.seeds] = 0
+            frontier, levels = self.seeds, []
+            while len(frontier):
+                idx = expand_ranges(np.searchsorted(S, frontier), np.searchsorted(S, frontier, 'right'))
+                idx = idx[depth[D[idx]] == -1]
+                dst, first = np.unique(D[idx], return_index=True)
+                depth[dst] = len(levels) + 1
+                levels.append(idx[first])
+                frontier = dst
+
+            # Subtree sizes, deepest level first
+            size[reached] = 1
+            for idx in reversed(levels):
+                np.add.at(size, S[idx], size[D[idx]])
+            if levels:
+                tree = np.concatenate(levels)
+                pairs.append(S[tree] * g.n_nodes + D[tree])
+                sizes.append(size[D[tree]])
+            depth[reached] = -1
+            size[reached] = 0
+        return (pair_totals(g, pairs, sizes, edges) / n_sim).tolist()
+
+# ── Dominator-tree blocking gains ───────────────────────────────────────────────
+
+def lengauer_tarjan(n, succ_ptr, succ, pred_ptr, pred):
+    """Immediate dominators of a flow graph on nodes 0..n-1 rooted at node 0.
+
+    Adjacency is given as CSR lists and every node must be reachable from 0.
+    Returns ``(idom, order)``: idom[0] is 0 and ``order`` is the DFS preorder,
+    in which every node comes after its immediate dominator.
+    """
+    dfn    = [-1] * n
+    parent = [0] * n
+    order  = [0]
+    dfn[0] = 0
+    stack  = [(0, succ_ptr[0])]
+    while stack:
+        v, i = stack[-1]
+        if i < succ_ptr[v + 1]:
+            stack[-1] = (v, i + 1)
+            w = succ[i]
+            if dfn[w] < 0:
+                dfn[w] = len(order)
+                order.append(w)
+                parent[w] = v
+                stack.append((w, succ_ptr[w]))
+        else:
+            stack.pop()
+
+    semi     = dfn[:]                 # dfn of the semidominator
+    label    = list(range(n))
+    ancestor = [-1] * n
+    idom     = [0] * n
+    bucket   = [[] for _ in range(n)]
+
+    def evaluate(v):
+        if ancestor[v] < 0:
+            return v
+        path = []
+        u = v
+        while ancestor[ancestor[u]] >= 0:
+            path.append(u)
+            u = ancestor[u]
+        for u in reversed(path):
+            a = ancestor[u]
+            if semi[label[a]] < semi[label[u]]:
+                label[u] = label[a]
+            ancestor[u] = ancestor[a]
+        return label[v]
+
+    for i in range(len(order) - 1, 0, -1):
+        w = order[i]
+        for j in range(pred_ptr[w], pred_ptr[w + 1]):
+            u = evaluate(pred[j])
+            if semi[u] < semi[w]:
+                semi[w] = semi[u]
+        bucket[order[semi[w]]].append(w)
+        p = parent[w]
+        ancestor[w] = p
+        for v in bucket[p]:
+            u = evaluate(v)
+            idom[v] = u if semi[u] < semi[v] else p
+        bucket[p] = []
+
+    for w in order[1:]:
+        if idom[w] != order[semi[w]]:
+            idom[w] = idom[idom[w]]
+    return idom, order
+
+
+class DominatorEngine(WorldStore):
+    """World store that scores every candidate edge in one pass per world.
+
+    In a fixed world, blocking (u, v) unburns exactly the nodes dominated by v
+    (v included) when (u, v) is the only way into v from outside v's dominator
+    subtree, and nothing otherwise. Only valid for unlimited hops, since a hop
+    limit also unburns nodes whose shortest path merely gets longer.
+    """
+
+    one_pass_gains = True
+
+    def all_gains(self, blocked_set, edges, n_sim):
+        """Mean drop in burned nodes from adding each of ``edges`` to blocked_set."""
+        return (self.gain_totals(blocked_set, edges, 0, n_sim) / n_sim).tolist()
+
+    def gain_totals(self, blocked_set, edges, start, stop):
+        """Summed drop in burned nodes for each of ``edges`` over worlds start..stop-1."""
+        g = self.graph
+        is_open = np.ones(g.n_edges, dtype=bool)
+        is_open[g.positions(blocked_set)] = False
+        samples = sample_mask(self.live.shape[1], stop, start)
+        burned  = self.spread(blocked_set, samples).view(np.uint8)
+        live    = self.live.view(np.uint8)
+
+        local = np.full(g.n_nodes, -1, dtype=np.int64)
+        pairs, sizes = [], []
+        if PROFILE.enabled:
+            PROFILE.count(dominator_trees=stop - start)
+        for j in range(start, stop):
+            byte, shift = j >> 3, 7 - (j & 7)
+            reached = np.flatnonzero((burned[:, byte] >> shift) & 1)
+            R = len(reached) + 1                           # local node 0 is a virtual root
+            local[reached] = np.arange(1, R)
+
+            pos = expand_ranges(g.indptr[reached], g.indptr[reached + 1])
+            pos = pos[is_open[pos] & ((live[pos, byte] >> shift) & 1).astype(bool)]
+            S = np.concatenate([np.zeros(len(self.seeds), dtype=np.int64), local[g.src[pos]]])
+            D = np.concatenate([local[self.seeds], local[g.indices[pos]]])
+            local[reached] = -1
+
+            by_dst   = np.argsort(D, kind='stable')
+            succ_ptr = np.searchsorted(S, np.arange(R + 1))
+            pred_ptr = np.searchsorted(D[by_dst], np.arange(R + 1))
+            idom, order = lengauer_tarjan(R, succ_ptr.tolist(), D.tolist(),
+                                          pred_ptr.tolist(), S[by_dst].tolist())
+
+            # Dominator-tree subtree sizes and preorder numbers
+            size = [1] * R
+            for w in reversed(order[1:]):
+                size[idom[w]] += size[w]
+            children = [[] for _ in range(R)]
+            for w in order[1:]:
+                children[idom[w]].append(w)
+            tin, stack = [0] * R, [0]
+            t = 0
+            while stack:
+                v = stack.pop()
+                tin[v] = t
+                t += 1
+                stack.extend(children[v])
+            tin, size = np.array(tin), np.array(size)
+
+            # An in-edge (w, v) enters v's subtree unless w is itself dominated by v;
+            # blocking (u, v) cuts v off iff u is the only source of entering edges.
+            inside = (tin[D] <= tin[S]) & (tin[S] < tin[D] + size[D])
+            enter  = np.unique(D[~inside] * R + S[~inside])
+            dst    = enter // R
+            sole   = np.bincount(dst, minlength=R)[dst] == 1
+            src    = enter % R
+            keep   = sole & (src != 0)
+            src, dst = src[keep], dst[keep]
+            pairs.append(reached[src - 1] * g.n_nodes + reached[dst - 1])
+            sizes.append(size[dst])
+
+        return pair_totals(g, pairs, sizes, edges)
+
+
+def pair_totals(g, pairs, sizes, edges):
+    """Sum ``sizes`` per node pair (u * n_nodes + v) and read them off for ``edges``."""
+    totals = defaultdict(float)
+    if pairs:
+        pairs, sizes = np.concatenate(pairs), np.concatenate(sizes)
+        uniq, inv = np.unique(pairs, return_inverse=True)
+        for pid, total in zip(uniq.tolist(), np.bincount(inv, weights=sizes).tolist()):
+            u, v = divmod(pid, g.n_nodes)
+            totals[(int(g.nodes[u]), int(g.nodes[v]))] = total
+    return np.array([totals[e] for e in edges], dtype=np.float64)
+
+# ── Reverse-reachable sketches ──────────────────────────────────────────────────
+
+class SketchEngine:
+    """sigma(R) from a fixed pool of reverse-reachable (RR) sketches.
+
+    Each sketch picks a random target among the nodes any fire can reach and
+    samples the live in-edges backwards from it (with the hop limit, only as
+    deep as a fire could come from). The target burns in that world iff the
+    seeds reach it over the sketch's unblocked edges, so sigma(R) is the
+    fraction of sketches still alive times the size of the reachable region.
+
+    ``index`` maps every candidate edge to the sketches that contain it; a
+    sketch's gain list holds the candidates lying on all of its seed paths,
+    so the gain of blocking one more edge is a counter lookup and a new
+    selection only re-checks the sketches indexed under it.
+    """
+
+    def __init__(self, graph, seeds, hops, n_sketches, candidates, rng=None):
+        self.graph = graph
+        self.hops  = hops
+        self.rng   = rng if rng is not None else np.random.default_rng()
+        seed_idx   = graph.node_indices(seeds)
+        self.n_missing = len(set(seeds)) - len(seed_idx)
+        self.is_seed   = set(seed_idx.tolist())
+        self.candidates = set(candidates)
+
+        region  = bfs_reachable(graph, seeds, None if hops == -1 else hops)
+        targets = np.flatnonzero(region)
+        self.scale = len(targets) / n_sketches if len(targets) else 0.0
+
+        # Reverse CSR: in-edges grouped by head node
+        by_dst  = np.argsort(graph.indices, kind='stable')
+        rev_ptr = np.zeros(graph.n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(graph.indices, minlength=graph.n_nodes), out=rev_ptr[1:])
+        self.rev = (rev_ptr, graph.src[by_dst], graph.probs[by_dst], region)
+
+        self.sketches = []              # (target, {u: [(v, edge), ...]}, seeds in sketch)
+        self.index = defaultdict(list)  # candidate edge -> ids of the sketches holding it
+        # no seed in the graph: the pool stays empty and only the seeds burn
+        draws = self.rng.choice(targets, n_sketches).tolist() if len(targets) else []
+        for t in draws:
+            sketch = self.sample(t)
+            if sketch is None:
+                continue                # no live path from any seed: dead for every R
+            sid = len(self.sketches)
+            self.sketches.append(sketch)
+            for e in {e for out in sketch[1].values() for _, e in out}:
+                if e in self.candidates:
+                    self.index[e].append(sid)
+        print(f"[INFO] RR sketches: {len(self.sketches)}/{n_sketches} reach a seed, "
+              f"{len(self.index)} candidate edges indexed", flush=True)
+
+    def sample(self, t):
+        """Live in-edges explored backwards from target t, or None if no seed is reached."""
+        rev_ptr, rev_src, rev_probs, region = self.rev
+        nodes = self.graph.nodes
+        depth, frontier, found, live = {t: 0}, [t], [], []
+        level = 0
+        while frontier and (self.hops == -1 or level < self.hops):
+            nxt = []
+            for v in frontier:
+                a, b = int(rev_ptr[v]), int(rev_ptr[v + 1])
+                if a == b:
+                    continue
+                hit = np.flatnonzero(self.rng.random(b - a) < rev_probs[a:b])
+                for u in rev_src[a + hit].tolist():
+                    if not region[u]:
+                        continue
+                    live.append((u, v))
+                    if u not in depth:
+                        depth[u] = level + 1
+                        nxt.append(u)
+                        if u in self.is_seed:
+                            found.append(u)
+            frontier = nxt
+            level += 1
+        if t in self.is_seed:
+            return t, {}, [t]
+        if not found:
+            return None
+
+        # Keep only edges on some seed -> t path short enough for the hop limit
+        succ = defaultdict(list)
+        for u, v in live:
+            succ[u].append(v)
+        dist, frontier = {s: 0 for s in found}, list(found)
+        while frontier:
+            nxt = []
+            for u in frontier:
+                for v in succ[u]:
+                    if v not in dist:
+                        dist[v] = dist[u] + 1
+                        nxt.append(v)
+            frontier = nxt
+        out = defaultdict(list)
+        for u, v in live:
+            if u in dist and (self.hops == -1 or dist[u] + 1 + depth[v] <= self.hops):
+                out[u].append((v, (int(nodes[u]), int(nodes[v]))))
+        return t, dict(out), found
+
+    def reaches(self, sketch, blocked_set, skip=None):
+        """Parent links of a seed -> target path avoiding blocked_set and skip, or None."""
+        t, out, found = sketch
+        if PROFILE.enabled:
+            PROFILE.count(sketch_checks=1)
+        if t in self.is_seed:
+            return {}
+        parent, frontier = dict.fromkeys(found), list(found)
+        level = 0
+        while frontier and (self.hops == -1 or level < self.hops):
+            nxt = []
+            for u in frontier:
+                for v, e in out.get(u, ()):
+                    if v in parent or e == skip or e in blocked_set:
+                        continue
+                    parent[v] = (u, e)
+                    if v == t:
+                        return parent
+                    nxt.append(v)
+            frontier = nxt
+            level += 1
+        return None
+
+    def critical(self, sketch, blocked_set):
+        """Candidate edges whose blocking kills the sketch, or None if it is already dead."""
+        parent = self.reaches(sketch, blocked_set)
+        if parent is None:
+            return None
+        crit, v = [], sketch[0]
+        while parent.get(v) is not None:        # every cut edge lies on any one path
+            u, e = parent[v]
+            if e in self.candidates and self.reaches(sketch, blocked_set, e) is None:
+                crit.append(e)
+            v = u
+        return crit
+
+    # ``base`` is the last committed blocking set with each sketch's critical
+    # edges under it (None = dead) and how many live sketches each edge cuts.
+
+    base = None     # (blocked frozenset, per-sketch critical lists, alive count, cut counts)
+
+    one_pass_gains = True
+
+    def commit(self, blocked_set, n_sim):
+        incremental = self.base is not None and self.base[0] <= blocked_set
+        if incremental:
+            crit, alive, cuts = list(self.base[1]), self.base[2], self.base[3].copy()
+            touched = self.touched(set(blocked_set) - self.base[0])
+        else:
+            crit, alive, cuts = [None] * len(self.sketches), 0, defaultdict(int)
+            touched = range(len(self.sketches))
+        for sid in touched:
+            old = crit[sid]
+            if old is None and incremental:
+                continue                        # blocking more never revives a sketch
+            if old is not None:
+                alive -= 1
+                for e in old:
+                    cuts[e] -= 1
+            crit[sid] = new = self.critical(self.sketches[sid], blocked_set)
+            if new is not None:
+                alive += 1
+                for e in new:
+                    cuts[e] += 1
+        self.base = (frozenset(blocked_set), crit, alive, cuts)
+
+    def touched(self, edges):
+        return sorted({sid for e in edges for sid in self.index.get(e, ())})
+
+    def estimate(self, blocked_set, n_sim):
+        """sigma(blocked_set); n_sim is unused, the sketch pool is fixed."""
+        if self.base is None or not self.base[0] <= blocked_set:
+            self.commit(blocked_set, n_sim)
+        base_blocked, crit, alive, cuts = self.base
+        extra = set(blocked_set) - base_blocked
+        if len(extra) == 1:
+            alive -= cuts.get(next(iter(extra)), 0)
+        elif extra:
+            alive -= sum(1 for sid in self.touched(extra) if crit[sid] is not None
+                         and self.reaches(self.sketches[sid], blocked_set) is None)
+        return alive * self.scale + self.n_missing
+
+    def all_gains(self, blocked_set, edges, n_sim):
+        """Drop in sigma from adding each of ``edges`` to blocked_set."""
+        if self.base is None or self.base[0] != blocked_set:
+            self.commit(blocked_set, n_sim)
+        cuts = self.base[3]
+        return [cuts.get(e, 0) * self.scale for e in edges]
+
+# ── Parallel evaluation ─────────────────────────────────────────────────────────
+
+LAZY_BATCH = 32     # stale heap entries re-evaluated together in parallel mode
+
+_worker = {}        # per-process state set up by _init_worker
+
+
+def share_array(arr, blocks):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    blocks.append(shm)
+    return shm.name, arr.shape, arr.dtype.str
+
+
+def attach_array(spec, blocks):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    blocks.append(shm)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def make_engine(kind, graph, seeds, hops, n_sim, rng=None, live=None):
+    if kind is BatchEngine:
+        return BatchEngine(graph, seeds, hops, rng)
+    return kind(graph, seeds, hops, n_sim, rng, live)
+
+
+def keyed_rng(engine, seed, blocked_set, *extra):
+    """A random stream determined by the seed and the blocked set alone."""
+    key = sorted(engine.graph.positions(blocked_set).tolist())
+    return np.random.default_rng([seed, len(key)] + key + list(extra))
+
+
+def keyed_estimate(engine, seed, blocked_set, n_sim):
+    engine.rng = keyed_rng(engine, seed, blocked_set)
+    return engine.estimate(blocked_set, n_sim)
+
+
+def _init_worker(kind, specs, seeds, hops, n_sim, seed, profile):
+    PROFILE.enabled = profile
+    blocks = []
+    arrays = {name: attach_array(spec, blocks) for name, spec in specs.items()}
+    graph  = CSRGraph(arrays['nodes'], arrays['indptr'], arrays['indices'], arrays['probs'])
+    _worker.update(blocks=blocks, seed=seed,
+                   engine=make_engine(kind, graph, seeds, hops, n_sim, live=arrays.get('live')))
+
+
+def attach_base(spec):
+    """Point the worker's engine at the committed base the parent last shared."""
+    if spec is None or _worker.get('base') == spec[1][0]:
+        return
+    engine = _worker['engine']
+    engine.base = None      # drop the views before closing the previous blocks
+    for shm in _worker.pop('base_blocks', []):
+        shm.close()
+    blocks = []
+    blocked, burned, counts, n_sim = spec
+    engine.base = (blocked, attach_array(burned, blocks), attach_array(counts, blocks), n_sim)
+    _worker.update(base=burned[0], base_blocks=blocks)
+
+
+def _estimate_task(args):
+    blocked_sets, n_sim, base = args
+    attach_base(base)
+    return ([keyed_estimate(_worker['engine'], _worker['seed'], b, n_sim) for b in blocked_sets],
+            PROFILE.take())
+
+
+def _gain_totals_task(args):
+    blocked_set, edges, start, stop = args
+    return _worker['engine'].gain_totals(blocked_set, edges, start, stop), PROFILE.take()
+
+
+class ParallelEvaluator:
+    """Engine front-end that fans estimates out to a process pool.
+
+    The CSR arrays, and the stored worlds if the engine has them, are copied
+    into shared memory once and every worker rebuilds the engine around them.
+    Each ``commit`` also shares the base's burned worlds, so the workers only
+    re-simulate the affected worlds, as the in-process engine does.
+    Each estimate draws from a stream keyed on the seed and the blocked set,
+    so results do not depend on the number of workers or how work is split.
+    """
+
+    def __init__(self, engine, seeds, workers, seed):
+        self.engine  = engine
+        self.seed    = seed
+        self.workers = workers
+        self.blocks  = []
+        self.stores_worlds = engine.stores_worlds
+        self.one_pass_gains = isinstance(engine, DominatorEngine)
+        self.base, self.base_blocks = None, []
+        if hasattr(engine, 'commit'):
+            self.commit = self.share_commit
+        g = engine.graph
+        arrays = {'nodes': g.nodes, 'indptr': g.indptr, 'indices': g.indices, 'probs': g.probs}
+        if isinstance(engine, WorldStore):
+            arrays['live'] = engine.live
+        specs = {name: share_array(arr, self.blocks) for name, arr in arrays.items()}
+        self.pool = multiprocessing.Pool(
+            workers, initializer=_init_worker,
+            initargs=(type(engine), specs, seeds, engine.hops, getattr(engine, 'n_sim', 0), seed,
+                      PROFILE.enabled))
+
+    def share_commit(self, blocked_set, n_sim):
+        """Commit in-process, then replace the shared copy of the base."""
+        self.engine.commit(blocked_set, n_sim)
+        self.release_base()
+        blocked, burned, counts, n = self.engine.base
+        self.base = (blocked, share_array(burned, self.base_blocks),
+                     share_array(counts, self.base_blocks), n)
+
+    def release_base(self):
+        for shm in self.base_blocks:
+            shm.close()
+            shm.unlink()
+        self.base, self.base_blocks = None, []
+
+    def collect(self, parts):
+        """Task results, with the workers' profile counters merged into ours."""
+        for _, counts in parts:
+            PROFILE.count(**counts)
+        return [result for result, _ in parts]
+
+    def chunks(self, items):
+        size = max(1, -(-len(items) // (4 * self.workers)))
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    def estimate(self, blocked_set, n_sim):
+        return keyed_estimate(self.engine, self.seed, blocked_set, n_sim)
+
+    def samples(self, blocked_set, start, stop):
+        self.engine.rng = keyed_rng(self.engine, self.seed, blocked_set, start)
+        return self.engine.samples(blocked_set, start, stop)
+
+    def estimate_many(self, blocked_sets, n_sim):
+        parts = self.collect(self.pool.map(_estimate_task,
+                                           [(c, n_sim, self.base) for c in self.chunks(blocked_sets)]))
+        return [x for part in parts for x in part]
+
+    def all_gains(self, blocked_set, edges, n_sim):
+        if isinstance(self.engine, DominatorEngine):
+            cuts = np.linspace(0, n_sim, min(n_sim, 4 * self.workers) + 1).astype(int).tolist()
+            tasks = [(blocked_set, edges, a, b) for a, b in zip(cuts, cuts[1:])]
+            return (sum(self.collect(self.pool.map(_gain_totals_task, tasks))) / n_sim).tolist()
+        base = self.estimate(blocked_set, n_sim)
+        return [base - x for x in self.estimate_many([blocked_set | {e} for e in edges], n_sim)]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.release_base()
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+
+# ── Checkpoints ─────────────────────────────────────────────────────────────────
+
+CHECKPOINT_EVERY = 60.0     # seconds between periodic checkpoints
+
+
+class Checkpoint:
+    """Greedy state pickled to ``path`` at most every ``every`` seconds.
+
+    Each write goes to a temporary file that is renamed over the previous
+    checkpoint, so a run killed mid-write still leaves a usable one. ``meta``
+    holds the arguments the state belongs to.
+    """
+
+    def __init__(self, path, every=CHECKPOINT_EVERY):
+        self.path  = path
+        self.every = every
+        self.meta  = {}
+        self.last  = time.perf_counter()
+
+    def due(self):
+        return time.perf_counter() - self.last >= self.every
+
+    def save(self, state, engine):
+        state = dict(state, meta=self.meta, rng=capture_rng(engine))
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.last = time.perf_counter()
+
+    def load(self):
+        """The saved state, or None if there is no checkpoint yet."""
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def capture_rng(engine):
+    """Python and NumPy generator states; the parallel front-end's streams are keyed instead."""
+    rng = getattr(getattr(engine, 'engine', engine), 'rng', None)
+    return random.getstate(), rng.bit_generator.state if rng is not None else None
+
+
+def restore_rng(state, engine):
+    py_state, np_state = state['rng']
+    random.setstate(py_state)
+    if np_state is not None:
+        getattr(engine, 'engine', engine).rng.bit_generator.state = np_state
+
+# ── Incremental updates ─────────────────────────────────────────────────────────
+
+def save_gains(path, gains, selected, seeds, hops, n_sim):
+    """Write the warm-start gains ``{(u, v): (gain, exact)}`` and the selection for --update."""
+    edges = list(gains)
+    us = np.array([u for u, _ in edges], dtype=np.int64)
+    vs = np.array([v for _, v in edges], dtype=np.int64)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f, us=us, vs=vs,
+                 gains=np.array([gains[e][0] for e in edges], dtype=np.float64),
+                 exact=np.array([gains[e][1] for e in edges], dtype=bool),
+                 selected=np.array(selected, dtype=np.int64).reshape(-1, 2),
+                 seeds=np.unique(np.asarray(seeds, dtype=np.int64)),
+                 hops=np.int64(hops), n_sim=np.int64(n_sim))
+    os.replace(tmp, path)
+
+
+def load_gains(path):
+    with np.load(path) as f:
+        gains = {(u, v): (g, x) for u, v, g, x in zip(f['us'].tolist(), f['vs'].tolist(),
+                                                     f['gains'].tolist(), f['exact'].tolist())}
+        return dict(gains=gains, selected=[tuple(e) for e in f['selected'].tolist()],
+                    seeds=f['seeds'], hops=int(f['hops']), n_sim=int(f['n_sim']))
+
+
+def load_diff(path):
+    """Edge changes as (op, u, v, p): ``+ u v p`` adds, ``- u v`` removes, ``u v p`` updates p."""
+    changes = []
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0].startswith('#'):
+                continue
+            op = parts.pop(0) if parts[0] in ('+', '-') else '='
+            u, v = int(parts[0]), int(parts[1])
+            p = float(parts[2]) if len(parts) > 2 else (None if op == '-' else 1.0)
+            changes.append((op, u, v, p))
+    return changes
+
+
+UPDATE_MIN_PROB = 0.01   # --update: weakest path probability that still links a candidate to a change
+
+
+def affected_candidates(graph, edges, changes, min_prob=UPDATE_MIN_PROB):
+    """Mask over ``edges`` of the candidates whose gain a change can move.
+
+    Blocking (u, v) only changes whether nodes downstream of v burn, so its
+    gain moves only if that region meets a node downstream of a changed edge
+    (either endpoint, which also covers removed edges and changes upstream
+    of u). As in maximum-influence-path heuristics, a node counts as
+    downstream when some path to it has probability at least ``min_prob``;
+    min_prob=0 gives plain reachability.
+    """
+    limit = -np.log(min_prob) if min_prob > 0 else np.inf
+    touched = graph.node_indices({x for _, u, v, _ in changes for x in (u, v)})
+    down = path_distances(graph, touched.tolist(), [0.0] * len(touched), limit)
+    # Distance from each candidate head to the nearest changed region, on the reversed graph
+    reverse = csr_from_edges(graph.nodes[graph.indices], graph.nodes[graph.src], graph.probs)
+    up = path_distances(reverse, list(down), list(down.values()), limit)    # same node numbering
+    heads = np.searchsorted(graph.nodes, np.array([v for _, v in edges], dtype=np.int64))
+    return np.array([h in up for h in heads.tolist()], dtype=bool)
+
+
+def path_distances(graph, sources, start, limit):
+    """Dijkstra over -log p edge lengths from ``sources`` (at distances ``start``), up to ``limit``."""
+    lengths = -np.log(np.clip(graph.probs.astype(np.float64), 1e-300, 1.0))
+    dist = {}
+    heap = list(zip(start, sources))
+    heapq.heapify(heap)
+    while heap:
+        d, x = heapq.heappop(heap)
+        if x in dist:
+            continue
+        dist[x] = d
+        a, b = int(graph.indptr[x]), int(graph.indptr[x + 1])
+        for y, w in zip(graph.indices[a:b].tolist(), lengths[a:b].tolist()):
+            if d + w <= limit and y not in dist:
+                heapq.heappush(heap, (d + w, y))
+    return dist
+
 # ── CELF greedy ─────────────────────────────────────────────────────────────────
 
-def celf_greedy(adj, edges, probs, seeds, k, n_sim, hops, output_path):
+ADAPTIVE_BATCH = 32      # minimum number of samples per sequential-sampling step
+
+WARM_SHARE = 0.4         # anytime mode: share of the time left that the warm-start may use
+PROBE_EDGES = 16         # anytime mode: candidates timed to plan the warm-start
+PROBE_SIMS = 64          # anytime mode: smaller of the two simulation counts they are timed at
+PROBE_SHARE = 0.25       # anytime mode: share of the warm-start time the probing may use
+WARM_CHUNK = 256         # anytime mode: candidates scored between deadline checks
+REFINE_FACTOR = 2        # anytime mode: step between simulation counts of the refinement
+
+
+def adaptive_gain(adj, seeds, blocked, hops, probs, n_sim, engine, base, edge, z,
+                  reject_below, accept_above=None):
+    """Sample the gain of blocking ``edge`` in batches until its confidence interval decides.
+
+    ``base`` holds the per-world burned counts of the current blocking set on
+    the engine's stored worlds, so the gain is sampled as a paired difference.
+    Stops early once the upper bound falls below ``reject_below`` or, after the
+    first batch, the lower bound rises above ``accept_above``; returns
+    ``(gain, exact, n_used)``, where a rejected candidate reports its upper
+    bound with ``exact`` False.
+    """
+    step = max(ADAPTIVE_BATCH, n_sim // 16)
+    n, total, total_sq = 0, 0.0, 0.0
+    while n < n_sim:
+        stop = min(n_sim, n + step)
+        x    = sample_sigma(adj, seeds, blocked | {edge}, hops, probs, n, stop, engine)
+        g    = base[n:stop] - x
+        n, total, total_sq = stop, total + g.sum(), total_sq + (g * g).sum()
+        mean = total / n
+        half = z * (max(total_sq / n - mean * mean, 0.0) / n) ** 0.5
+        if n < n_sim and mean + half < reject_below:
+            return mean + half, False, n
+        if accept_above is not None and n > step and mean - half > accept_above:
+            break
+    return mean, True, n
+
+
+def marginal_gains(adj, seeds, blocked, hops, probs, n_sim, engine, current_sigma, edges):
+    """current_sigma minus sigma(blocked + e) for each e in edges."""
+    if hasattr(engine, 'estimate_many'):
+        sigmas = engine.estimate_many([blocked | {e} for e in edges], n_sim)
+    else:
+        sigmas = [estimate_sigma(adj, seeds, blocked | {e}, hops, probs, n_sim, engine) for e in edges]
+    return [current_sigma - x for x in sigmas]
+
+
+def plan_warm_start(adj, seeds, hops, probs, engine, current_sigma, edges, n_sim, seconds, batch=1):
+    """Simulations per candidate that fit a warm-start over ``edges`` into ``seconds``.
+
+    Times a few candidate evaluations at two simulation counts and fits
+    cost = a + b * n per evaluation. The probing keeps to PROBE_SHARE of
+    ``seconds``: it starts with a single evaluation, and no batch runs once
+    the cost measured so far says it would end past that share.
+    """
+    start = time.perf_counter()
+    stop  = start + PROBE_SHARE * seconds
+    probe = edges[::max(1, len(edges) // PROBE_EDGES)][:PROBE_EDGES]
+    points = sorted({min(n_sim, PROBE_SIMS), min(n_sim, 8 * PROBE_SIMS)})
+    costs = []
+    for n in points:
+        t0, done = time.perf_counter(), 0
+        per_eval = costs[0] * n / points[0] if costs else None    # cost is at most linear in n
+        while done < len(probe):
+            group = probe[done:done + (batch if done else 1)]
+            if per_eval is not None and time.perf_counter() + per_eval * len(group) > stop:
+                break
+            marginal_gains(adj, seeds, set(), hops, probs, n, engine, current_sigma, group)
+            done += len(group)
+            per_eval = (time.perf_counter() - t0) / done
+        if not done:
+            break
+        costs.append(per_eval)
+    if len(costs) == 1:
+        a, b = 0.0, costs[0] / points[0]
+    else:
+        b = max((costs[1] - costs[0]) / (points[1] - points[0]), 1e-12)
+        a = max(costs[0] - b * points[0], 0.0)
+    left = seconds - (time.perf_counter() - start)
+    return max(1, min(n_sim, int((left / max(1, len(edges)) - a) / b)))
+
+
+def provisional(selected, heap, blocked, k):
+    """``selected`` padded up to k edges with the best entries left in the heap."""
+    fill = [(u, v) for _, _, u, v in heapq.nsmallest(k + len(blocked), heap) if (u, v) not in blocked]
+    return selected + fill[:k - len(selected)]
+
+
+def celf_greedy(adj, edges, probs, seeds, k, n_sim, hops, output_path, engine=None, delta=None,
+                deadline=None, bounds=None, checkpoint=None, resume=None, on_select=None,
+                reuse=None, on_warm=None, on_done=None):
     blocked = set()
     selected = []
 
-    # Compute baseline
-    sigma_empty = estimate_sigma(adj, seeds, blocked, hops, probs, n_sim)
+    def publish(routes):
+        if output_path is not None:     # None: the caller streams selections via on_select
+            write_output(output_path, routes)
+
+    # Sequential sampling: stop each evaluation once a one-sided interval settles
+    # it. Only on stored worlds, where gains are paired with the base per world;
+    # delta is split over every look of one warm-start and k round evaluations
+    # of each candidate, so it bounds the chance that any test errs
+    batch = LAZY_BATCH if hasattr(engine, 'estimate_many') else 1
+    adaptive = delta is not None and batch == 1 and getattr(engine, 'stores_worlds', False)
+    if adaptive:
+        looks = -(-n_sim // max(ADAPTIVE_BATCH, n_sim // 16))
+        z = NormalDist().inv_cdf(1 - delta / (max(1, len(edges)) * (k + 1) * looks))
+    sims_used = sims_full = 0
+
+    # Anytime mode (deadline = perf_counter() time): simulation counts are
+    # planned from the measured speed, and the output always holds k edges.
+    # The baseline starts at the probe count; the rounds raise it as time allows
+    n_round = n_sim if deadline is None or resume is not None else min(n_sim, PROBE_SIMS)
+    empty_counts = None     # per-world sigma(null), to report the reduction on the final worlds
+
+    def current_base():
+        # per-world burned counts for paired gains, else the plain mean
+        if adaptive:
+            counts = sample_sigma(adj, seeds, blocked, hops, probs, 0, n_round, engine)
+            return counts, counts.mean()
+        sigma = estimate_sigma(adj, seeds, blocked, hops, probs, n_round, engine)
+        return sigma, sigma
+
+    def snapshot(phase, **extra):
+        return dict(extra, phase=phase, blocked=blocked, selected=selected, base=base,
+                    sigma_empty=sigma_empty, current_sigma=current_sigma, n_round=n_round,
+                    n_sim_init=n_sim_init, sims=(sims_used, sims_full))
+
+    # Compute baseline (or pick up where the checkpoint left off)
+    if resume is not None:
+        blocked, selected = set(resume['blocked']), list(resume['selected'])
+        n_round, n_sim_init = resume['n_round'], resume['n_sim_init']
+        base, sigma_empty, current_sigma = resume['base'], resume['sigma_empty'], resume['current_sigma']
+        sims_used, sims_full = resume['sims']
+        if hasattr(engine, 'commit'):
+            engine.commit(blocked, n_round)
+        restore_rng(resume, engine)
+        print(f"[INFO] Resumed at {resume['phase']} with {len(selected)} selected", flush=True)
+    else:
+        if deadline is not None:
+            publish(edges[:k])          # k edges on disk before the first simulation
+        if hasattr(engine, 'commit'):
+            engine.commit(blocked, n_round)   # later estimates only re-simulate affected worlds
+        base, sigma_empty = current_base()
+        current_sigma = sigma_empty
+        if deadline is not None and getattr(engine, 'stores_worlds', False) and hasattr(engine, 'commit'):
+            # committed worlds: per-world counts cost no extra simulation
+            empty_counts = sample_sigma(adj, seeds, blocked, hops, probs, 0, n_round, engine)
+    n_base = n_round        # simulations behind the current base
+    PROFILE.info['sigma_empty'] = sigma_empty
     print(f"[INFO] sigma(null) = {sigma_empty:.4f}", flush=True)
 
     # --- Initial marginal gain priority queue (max-heap via negation) ---
     # heap entries: (-gain, edge, iteration_added)
     heap = []
-    current_sigma = sigma_empty
 
-    # Warm-start: compute gain for every candidate edge
-    n_sim_init = n_sim
+    if resume is None or resume['phase'] == 'warm':
+        # Warm-start: compute gain for every candidate edge (in anytime mode, a
+        # coarse ranking sized to a share of the time left)
+        warm = resume['warm'] if resume is not None else {}
+        gains, heap, top = warm.get('gains', []), warm.get('heap', []), warm.get('top', [])
+        done = warm.get('done', 0)    # candidates scored so far
+        if resume is None:
+            n_sim_init = n_sim
+        reused = []
+        if reuse:
+            # --update: candidates outside the changed region keep their saved
+            # gains and only the rest are scored
+            keep   = [i for i, e in enumerate(edges) if e not in reuse]
+            reused = [(e, reuse[e]) for e in edges if e in reuse]
+            edges  = [edges[i] for i in keep]
+            if bounds is not None:
+                bounds = [bounds[i] for i in keep]
+            if not warm:
+                top = heapq.nlargest(k, (gain for _, (gain, exact) in reused if exact))
+                heapq.heapify(top)
+            print(f"[INFO] Reusing {len(reused)} saved gains; scoring {len(edges)} candidates", flush=True)
+        one_pass = hasattr(engine, 'all_gains') and (deadline is None or
+                                                     getattr(engine, 'one_pass_gains', False))
+        if deadline is not None:
+            warm_deadline = time.perf_counter() + WARM_SHARE * (deadline - time.perf_counter())
+            if not one_pass and resume is None and edges:
+                n_sim_init = plan_warm_start(adj, seeds, hops, probs, engine, current_sigma, edges,
+                                             n_sim, warm_deadline - time.perf_counter(), batch)
+                if n_sim_init != n_base:
+                    # score the candidates against a baseline on the same worlds
+                    n_round = n_sim_init
+                    if hasattr(engine, 'commit'):
+                        engine.commit(blocked, n_round)
+                    base, current_sigma = current_base()
+                    n_base = n_round
 
-    print(f"[INFO] |E|={len(edges)}, init sims={n_sim_init}, full sims={n_sim}", flush=True)
+        def save_warm():
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save(snapshot('warm', warm=dict(gains=gains, heap=heap, top=top,
+                                                           done=done)), engine)
 
-    for (u, v) in edges:
-        b = blocked | {(u, v)}
-        gain = current_sigma - estimate_sigma(adj, seeds, b, hops, probs, n_sim_init)
-        heapq.heappush(heap, (-gain, 0, u, v))   # 0 = iteration when gain was computed
+        print(f"[INFO] |E|={len(edges)}, init sims={n_sim_init}, full sims={n_sim}", flush=True)
 
-    iteration = 0
+        warm_start = time.perf_counter()
+        unscored = []
+        if bounds is not None:
+            # Highest upper bound first; the tail that is never scored enters
+            # the heap with its bound as a stale entry
+            order  = sorted(range(len(edges)), key=lambda i: -bounds[i])
+            edges  = [edges[i] for i in order]
+            bounds = [bounds[i] for i in order]
+        chunk = WARM_CHUNK if deadline is not None or checkpoint is not None else max(1, len(edges))
+        if one_pass and deadline is not None and hasattr(engine, 'gain_totals'):
+            # Anytime: sum the per-world gains over growing world ranges until
+            # the next range would run past the warm-start share
+            totals, n_done, per_world = 0, 0, 0.0
+            while n_done < n_sim:
+                stop = min(n_sim, max(1, 2 * n_done))
+                if n_done and time.perf_counter() + per_world * (stop - n_done) > warm_deadline:
+                    break
+                t0 = time.perf_counter()
+                totals = totals + engine.gain_totals(blocked, edges, n_done, stop)
+                per_world = (time.perf_counter() - t0) / (stop - n_done)
+                n_done = stop
+            n_sim_init = n_done
+            gains = (totals / n_done).tolist()
+        elif one_pass:
+            gains = engine.all_gains(blocked, edges, n_sim_init)
+        elif adaptive:
+            # Rejected candidates enter with their upper bound and iteration -1,
+            # so CELF treats them as stale and re-evaluates them if they surface
+            # (top: min-heap of the k best exact gains so far)
+            for (u, v) in edges[done:]:
+                if deadline is not None and time.perf_counter() > warm_deadline:
+                    break
+                threshold = top[0] if len(top) == k else float('-inf')
+                gain, exact, used = adaptive_gain(adj, seeds, blocked, hops, probs, n_sim_init, engine,
+                                                  base, (u, v), z, threshold)
+                sims_used, sims_full = sims_used + used, sims_full + n_sim_init
+                heapq.heappush(heap, (-gain, 0 if exact else -1, u, v))
+                if exact:
+                    heapq.heappush(top, gain)
+                    if len(top) > k:
+                        heapq.heappop(top)
+                done += 1
+                save_warm()
+            unscored = edges[done:]
+        elif bounds is not None and deadline is None:
+            # Stop once no remaining bound can beat the k-th best exact gain
+            while done < len(edges):
+                if len(top) == k and bounds[done] < top[0]:
+                    break
+                for gain in marginal_gains(adj, seeds, blocked, hops, probs, n_sim_init, engine,
+                                           current_sigma, edges[done:done + batch]):
+                    gains.append(gain)
+                    heapq.heappush(top, gain)
+                    if len(top) > k:
+                        heapq.heappop(top)
+                done = len(gains)
+                save_warm()
+            unscored = edges[done:]
+            print(f"[INFO] Upper bounds pruned {len(unscored)}/{len(edges)} candidates", flush=True)
+        else:
+            while done < len(edges):
+                size = chunk
+                if deadline is not None:
+                    left = warm_deadline - time.perf_counter()
+                    if left <= 0:
+                        break
+                    # no chunk that the speed so far says would end past the share
+                    per_eval = (time.perf_counter() - warm_start) / done if done else None
+                    size = max(1, min(chunk, int(left / per_eval))) if done else batch
+                gains += marginal_gains(adj, seeds, blocked, hops, probs, n_sim_init, engine,
+                                        current_sigma, edges[done:done + size])
+                done = len(gains)
+                save_warm()
+            unscored = edges[done:]
+
+        # Coarse gains are stale: the rounds refine them with more simulations
+        if deadline is not None:
+            n_round = n_sim if n_sim_init >= n_sim else min(n_sim, REFINE_FACTOR * n_sim_init)
+        fresh = 0 if n_sim_init >= n_round else -1
+        for (u, v), gain in zip(edges, gains):
+            heapq.heappush(heap, (-gain, fresh, u, v))   # 0 = iteration when gain was computed
+        for i, (u, v) in enumerate(unscored, len(edges) - len(unscored)):
+            heapq.heappush(heap, (-bounds[i] if bounds is not None else 0.0, -1, u, v))
+        for (u, v), (gain, exact) in reused:
+            heapq.heappush(heap, (-gain, 0 if exact else -1, u, v))
+        PROFILE.add_time('warm_start', warm_start)
+        PROFILE.count(warm_start_evaluations=len(edges) - len(unscored))
+        if on_warm is not None:
+            on_warm(heap)
+        if deadline is not None:
+            publish(provisional(selected, heap, blocked, k))
+            if unscored:
+                print(f"[INFO] Time budget: {len(unscored)} candidates left unscored", flush=True)
+        iteration = 0
+        if checkpoint is not None:
+            checkpoint.save(snapshot('rounds', heap=heap, iteration=iteration), engine)
+    else:
+        heap, iteration = resume['heap'], resume['iteration']
+
+    out_of_time = False
     while len(selected) < k and heap:
+        round_start = time.perf_counter()
+        cut_short = False
+        if deadline is not None:
+            round_deadline = round_start + (deadline - round_start) / (k - len(selected))
+            if n_round != n_base:
+                if hasattr(engine, 'commit'):
+                    engine.commit(blocked, n_round)
+                base, current_sigma = current_base()
+                n_base = n_round
         while True:
             neg_gain, iter_computed, u, v = heapq.heappop(heap)
+            PROFILE.count(heap_pops=1)
             if (u, v) in blocked:
                 continue
             if iter_computed == iteration:
                 # Gain is current — accept
+                PROFILE.count(fresh_accepts=1)
                 break
+            now = time.perf_counter() if deadline is not None else 0
+            if deadline is not None and now > round_deadline:
+                refined = [entry for entry in heap if entry[1] == iteration]
+                if now > deadline or refined:
+                    heapq.heappush(heap, (neg_gain, iter_computed, u, v))
+                    if now > deadline:
+                        out_of_time = True
+                        break
+                    # Out of time for this round: take the best gain refined in it
+                    best = min(refined)
+                    heap.remove(best)
+                    heapq.heapify(heap)
+                    neg_gain, _, u, v = best
+                    cut_short = True
+                    break
+            PROFILE.count(lazy_recomputations=1)
+            if adaptive:
+                # Only needs to tell whether (u, v) beats the next bound in the heap
+                threshold = -heap[0][0] if heap else float('-inf')
+                gain, exact, used = adaptive_gain(adj, seeds, blocked, hops, probs, n_round, engine,
+                                                  base, (u, v), z, threshold, threshold)
+                sims_used, sims_full = sims_used + used, sims_full + n_round
+                heapq.heappush(heap, (-gain, iteration if exact else -1, u, v))
             else:
-                # Recompute marginal gain
-                b = blocked | {(u, v)}
-                gain = current_sigma - estimate_sigma(adj, seeds, b, hops, probs, n_sim)
-                heapq.heappush(heap, (-gain, iteration, u, v))
+                # Recompute marginal gain (in parallel mode, together with the
+                # stale entries right below it)
+                stale = [(u, v)]
+                while batch > 1 and heap and len(stale) < batch and heap[0][1] != iteration:
+                    _, _, x, y = heapq.heappop(heap)
+                    PROFILE.count(heap_pops=1)
+                    if (x, y) not in blocked:
+                        stale.append((x, y))
+                PROFILE.count(lazy_recomputations=len(stale) - 1)
+                gains = marginal_gains(adj, seeds, blocked, hops, probs, n_round, engine, current_sigma, stale)
+                for (x, y), gain in zip(stale, gains):
+                    heapq.heappush(heap, (-gain, iteration, x, y))
                 # Loop: the heap will now return the freshest best candidate
+        if out_of_time:
+            break
 
         # Select edge (u, v)
         blocked.add((u, v))
         selected.append((u, v))
         iteration += 1
-        current_sigma = estimate_sigma(adj, seeds, blocked, hops, probs, n_sim)
+        if hasattr(engine, 'commit'):
+            engine.commit(blocked, n_round)
+        base, current_sigma = current_base()
+        n_base = n_round
+        PROFILE.add_time('rounds', round_start)
+        if PROFILE.enabled:
+            PROFILE.end_round(round_start, edge=[u, v], gain=-neg_gain, sigma=current_sigma)
         print(
             f"[{iteration}/{k}] blocked ({u},{v}), gain={-neg_gain:.4f}, "
             f"sigma(R)={current_sigma:.4f}",
             flush=True
         )
+        if on_select is not None:
+            on_select(iteration, (u, v), -neg_gain, current_sigma)
 
         # Write partial output after every selection (partial credit on timeout)
-        write_output(output_path, selected)
+        if deadline is None:
+            publish(selected)
+        else:
+            publish(provisional(selected, heap, blocked, k))
+            # Halve the precision after a round that ran out of time, double
+            # it after one that used less than half of its share
+            if cut_short:
+                n_round = max(n_sim_init, n_round // 2)
+            elif 2 * (time.perf_counter() - round_start) < round_deadline - round_start:
+                n_round = min(n_sim, REFINE_FACTOR * n_round)
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save(snapshot('rounds', heap=heap, iteration=iteration), engine)
 
-    reduction = (sigma_empty - current_sigma) / sigma_empty if sigma_empty > 0 else 0
+    if empty_counts is not None and n_base != len(empty_counts):
+        # anytime mode: compare both sigmas on the worlds they share
+        n_common = min(n_base, len(empty_counts))
+        final = sample_sigma(adj, seeds, blocked, hops, probs, 0, n_common, engine).mean()
+        reduction_base, reduction_sigma = empty_counts[:n_common].mean(), final
+    else:
+        reduction_base, reduction_sigma = sigma_empty, current_sigma
+    reduction = (reduction_base - reduction_sigma) / reduction_base if reduction_base > 0 else 0
+    PROFILE.info.update(sigma_final=current_sigma, reduction_ratio=reduction)
     print(f"[INFO] Final sigma(R)={current_sigma:.4f}, reduction ratio={reduction:.4f}", flush=True)
+    if on_done is not None:
+        on_done(sigma_empty, current_sigma, reduction)
+    if sims_full:
+        print(f"[INFO] Adaptive sampling ran {sims_used}/{sims_full} candidate simulations", flush=True)
+    if out_of_time:
+        print(f"[INFO] Time budget reached after {len(selected)} selections; "
+              f"the rest come from the current ranking", flush=True)
+        selected = provisional(selected, heap, blocked, k)
     return selected
 
+# ── Server mode ─────────────────────────────────────────────────────────────────
+
+SERVE_CACHE_MB = 1024   # default cap on the sampled worlds kept between queries
+
+
+class QueryServer:
+    """Answers JSON-line queries against one graph that is loaded once.
+
+    A query is an object such as ``{"id": 1, "seeds": [1, 2], "k": 5,
+    "n_sim": 200, "hops": -1}`` (``seed_file`` may replace ``seeds``;
+    ``engine``, ``seed``, ``adaptive``, ``prune`` and ``time_budget`` are
+    optional). Each selection is streamed back as a ``select`` event as soon
+    as it is made, followed by one ``done`` (or ``error``) event.
+
+    Worlds do not depend on the seed set or the hop limit, so queries run on
+    the full graph and share live-edge matrices keyed by (n_sim, seed),
+    kept in an LRU cache under ``cache_bytes``.
+    """
+
+    def __init__(self, graph, cache_bytes):
+        self.graph = graph
+        self.cache_bytes = cache_bytes
+        self.worlds = OrderedDict()   # (n_sim, seed) -> live-edge bit matrix
+        self.adj = None
+
+    def live(self, n_sim, seed):
+        key = (n_sim, seed)
+        if key in self.worlds:
+            self.worlds.move_to_end(key)
+            return self.worlds[key]
+        live = WorldStore(self.graph, [], -1, n_sim, np.random.default_rng(seed)).live
+        self.worlds[key] = live
+        while len(self.worlds) > 1 and self.cached_bytes() > self.cache_bytes:
+            self.worlds.popitem(last=False)
+        return live
+
+    def cached_bytes(self):
+        return sum(live.nbytes for live in self.worlds.values())
+
+    def make_engine(self, name, seeds, hops, n_sim, seed, candidates):
+        g = self.graph
+        if name == 'python':
+            if self.adj is None:
+                self.adj = g.adjacency()
+            return None
+        if name == 'batch':
+            return BatchEngine(g, seeds, hops, np.random.default_rng(seed))
+        if name == 'sketch':
+            n_sketches = SKETCHES_PER_SIM * n_sim
+            return SketchEngine(g, seeds, hops, n_sketches, candidates, np.random.default_rng(seed))
+        kind = DominatorEngine if name == 'dominator' and hops == -1 else WorldStore
+        return kind(g, seeds, hops, n_sim, live=self.live(n_sim, seed))
+
+    def answer(self, query, emit):
+        start = time.perf_counter()
+        qid   = query.get('id')
+        seeds = query['seeds'] if 'seeds' in query else load_seeds(query['seed_file'])
+        k, n_sim, hops = int(query['k']), int(query.get('n_sim', 100)), int(query.get('hops', -1))
+        name  = query.get('engine', 'worlds')
+        seed  = int(query.get('seed', 0))
+        if name not in ENGINES:
+            raise ValueError(f"unknown engine {name!r}")
+        if k <= 0 or n_sim <= 0 or hops < -1:
+            raise ValueError("k and n_sim must be positive and hops -1 or more")
+        random.seed(seed)
+
+        deadline = None
+        if 'time_budget' in query:
+            budget   = float(query['time_budget'])
+            deadline = start + budget - max(TIME_MARGIN * budget, 0.5)
+        delta = float(query['adaptive']) if 'adaptive' in query else None
+        if (deadline is not None or delta is not None) and name in ('python', 'batch'):
+            name = 'worlds'     # coarse and sequential gains need shared worlds, as on the command line
+
+        candidates = prefilter_edges(self.graph, seeds, hops)
+        engine = self.make_engine(name, seeds, hops, n_sim, seed, candidates)
+        bounds = None
+        if query.get('prune'):
+            bounds = gain_bounds(self.graph, seeds, hops, engine, candidates, query['prune'], seed)
+
+        def on_select(i, edge, gain, sigma):
+            emit({'id': qid, 'event': 'select', 'round': i, 'edge': list(edge),
+                  'gain': gain, 'sigma': sigma})
+
+        sigmas = {}
+
+        def on_done(sigma_empty, sigma_final, reduction):
+            sigmas.update(sigma_empty=sigma_empty, sigma_final=sigma_final,
+                          reduction_ratio=reduction)
+
+        selected = celf_greedy(self.adj if name == 'python' else None, candidates, None, seeds, k,
+                               n_sim, hops, None, engine, delta, deadline, bounds,
+                               on_select=on_select, on_done=on_done)
+        emit(dict(id=qid, event='done', selected=[list(e) for e in selected], **sigmas,
+                  seconds=time.perf_counter() - start))
+
+    def handle(self, line, emit):
+        """Answer one request line; any failure is reported as an error event."""
+        query = None
+        try:
+            query = json.loads(line)
+            if not isinstance(query, dict):
+                raise ValueError("a query must be a JSON object")
+            if query.get('cmd') == 'stats':
+                emit({'id': query.get('id'), 'event': 'stats', 'cached_worlds': len(self.worlds),
+                      'cached_bytes': self.cached_bytes(), 'cache_cap_bytes': self.cache_bytes})
+                return
+            with redirect_stdout(sys.stderr):       # progress prints stay off the reply stream
+                self.answer(query, emit)
+        except Exception as e:         # a bad query must not take the server down
+            emit({'id': query.get('id') if isinstance(query, dict) else None,
+                  'event': 'error', 'message': f"{type(e).__name__}: {e}"})
+
+
+class _QueryHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        def emit(msg):
+            self.wfile.write((json.dumps(msg) + '\n').encode())
+            self.wfile.flush()
+        try:
+            for raw in self.rfile:
+                line = raw.decode().strip()
+                if line:
+                    self.server.queries.handle(line, emit)
+        except (BrokenPipeError, ConnectionError):
+            pass        # client went away
+
+
+def serve(graph, options):
+    """Run the query loop on stdin/stdout, or on a Unix socket with --socket PATH."""
+    cache_bytes = int(float(options.get('cache-mb', SERVE_CACHE_MB)) * 2**20)
+    queries = QueryServer(graph, cache_bytes)
+    out = sys.stdout
+
+    def emit(msg):
+        out.write(json.dumps(msg) + '\n')
+        out.flush()
+
+    if 'socket' not in options:
+        print("[INFO] Serving JSON-line queries on stdin", file=sys.stderr, flush=True)
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                queries.handle(line, emit)
+        return
+
+    path = options['socket']
+    if os.path.exists(path):
+        os.remove(path)     # stale socket from an earlier server
+    with socketserver.UnixStreamServer(path, _QueryHandler) as server:
+        server.queries = queries
+        print(f"[INFO] Serving JSON-line queries on {path}", file=sys.stderr, flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
+
 # ── Entry point ─────────────────────────────────────────────────────────────────
 
+USAGE = ("Usage: python3 forest_fire.py <graph> <seed_set> <output> <k> <n_sim> <hops> "
+         "[--engine python|batch|worlds|dominator|sketch] [--sketches N] [--seed N] [--workers N] "
+         "[--adaptive DELTA] [--prune [PILOT]] [--time-budget SECONDS] [--no-cache] "
+         "[--profile [PATH]] [--checkpoint [PATH]] [--checkpoint-every SECONDS] [--resume] "
+         "[--save-gains [PATH]] [--update PREV_GAINS --diff FILE [--min-prob P]]\n"
+         "       python3 forest_fire.py <graph> --serve [--socket PATH] [--cache-mb MB] [--no-cache]")
+
+ENGINES = ('python', 'batch', 'worlds', 'dominator', 'sketch')
+
+TIME_MARGIN = 0.05      # share of --time-budget kept free for writing the output
+
+PILOT_SIMS = 64         # worlds behind the --prune bounds for fresh-sample engines
+
+SKETCHES_PER_SIM = 10   # default RR sketch pool size, per requested simulation
+
+
+def parse_args(argv):
+    """Split argv into positional arguments and a dict of ``--name value`` options."""
+    positional, options = [], {}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg.startswith('--'):
+            name, eq, value = arg[2:].partition('=')
+            if not eq:
+                if i + 1 < len(argv) and not argv[i + 1].startswith('--'):
+                    value = argv[i + 1]
+                    i += 1
+                else:
+                    value = True
+            options[name] = value
+        else:
+            positional.append(arg)
+        i += 1
+    return positional, options
+
+
 def main():
-    if len(sys.argv) != 7:
-        print("Usage: python3 forest_fire.py <graph> <seed_set> <output> <k> <n_sim> <hops>")
+    t_start = time.perf_counter()
+    args, options = parse_args(sys.argv[1:])
+    if 'serve' in options and len(args) == 1:
+        print(f"[INFO] Loading graph from {args[0]}", file=sys.stderr, flush=True)
+        serve(load_graph(args[0], use_cache='no-cache' not in options), options)
+        return
+    if len(args) != 6 or ('update' in options) != ('diff' in options):
+        print(USAGE)
         sys.exit(1)
 
-    graph_path  = sys.argv[1]
-    seed_path   = sys.argv[2]
-    output_path = sys.argv[3]
-    k           = int(sys.argv[4])
-    n_sim       = int(sys.argv[5])
-    hops        = int(sys.argv[6])   # -1 means unlimited
+    graph_path  = args[0]
+    seed_path   = args[1]
+    output_path = args[2]
+    k           = int(args[3])
+    n_sim       = int(args[4])
+    hops        = int(args[5])   # -1 means unlimited
+    engine_name = options.get('engine', 'python')
+    if engine_name not in ENGINES:
+        print(USAGE)
+        sys.exit(1)
 
     # Ensure output directory exists
     os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    PROFILE.enabled = 'profile' in options
 
     print(f"[INFO] Loading graph from {graph_path}", flush=True)
-    adj, edges, probs = load_graph(graph_path)
-    seeds = load_seeds(seed_path)
-    print(f"[INFO] |V_adj|={len(adj)}, |E|={len(edges)}, |seeds|={len(seeds)}, k={k}, hops={hops}", flush=True)
+    with PROFILE.phase('load_graph'):
+        graph = load_graph(graph_path, use_cache='no-cache' not in options)
+        seeds = load_seeds(seed_path)
+    print(f"[INFO] |V|={graph.n_nodes}, |E|={graph.n_edges}, |seeds|={len(seeds)}, k={k}, hops={hops}", flush=True)
+
+    if hops != -1:
+        # Everything after this only ever looks inside the hop ball
+        with PROFILE.phase('hop_ball'):
+            graph = hop_ball(graph, seeds, hops)
+        print(f"[INFO] Hop ball: |V|={graph.n_nodes}, |E|={graph.n_edges}", flush=True)
 
     # Remove edges that cannot possibly be on any fire-spread path
     # (simple pre-filter: keep only edges reachable from seeds within hops BFS)
-    candidate_edges = prefilter_edges(adj, edges, seeds, hops)
+    with PROFILE.phase('prefilter'):
+        candidate_edges = prefilter_edges(graph, seeds, hops)
     print(f"[INFO] Candidate edges after pre-filter: {len(candidate_edges)}", flush=True)
 
-    selected = celf_greedy(adj, candidate_edges, probs, seeds, k, n_sim, hops, output_path)
+    deadline = None
+    if 'time-budget' in options:
+        budget   = float(options['time-budget'])
+        deadline = t_start + budget - max(TIME_MARGIN * budget, 0.5)   # leave time to write and exit
+    workers = int(options.get('workers', 0))
+    delta   = float(options['adaptive']) if 'adaptive' in options else None
+    seed = int(options['seed']) if 'seed' in options else None
+    if workers and seed is None:
+        seed = random.SystemRandom().randrange(2**63)    # per-evaluation streams need a base seed
+    if workers and engine_name == 'python':
+        print("[INFO] --workers needs a NumPy engine; using the batch engine", flush=True)
+        engine_name = 'batch'
+    if deadline is not None and engine_name in ('python', 'batch'):
+        # coarse gains are only comparable when every candidate sees the same worlds
+        print("[INFO] --time-budget ranks on shared worlds; using the world store", flush=True)
+        engine_name = 'worlds'
+    if workers and engine_name == 'sketch':
+        print("[INFO] sketch gains are index lookups; ignoring --workers", flush=True)
+        workers = 0
+    if delta is not None and workers:
+        print("[INFO] --adaptive samples one candidate at a time; ignoring it with --workers", flush=True)
+        delta = None
+    if delta is not None and engine_name in ('python', 'batch'):
+        # unpaired gains on fresh samples are too noisy to stop on
+        print("[INFO] --adaptive pairs gains per world; using the world store", flush=True)
+        engine_name = 'worlds'
+    if delta is not None and engine_name == 'sketch':
+        print("[INFO] sketch gains are index lookups; ignoring --adaptive", flush=True)
+        delta = None
+
+    checkpoint, resume = None, None
+    if 'checkpoint' in options or 'resume' in options:
+        path = options.get('checkpoint')
+        checkpoint = Checkpoint(path if isinstance(path, str) else output_path + '.ckpt',
+                                float(options.get('checkpoint-every', CHECKPOINT_EVERY)))
+        if 'resume' in options:
+            resume = checkpoint.load()
+            if resume is None:
+                print(f"[INFO] No checkpoint at {checkpoint.path}; starting afresh", flush=True)
+            elif seed is None:
+                seed = resume['meta']['seed']
+        if seed is None:
+            seed = random.SystemRandom().randrange(2**63)    # a resumed run must redraw the same worlds
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    if deadline is not None and resume is None:
+        write_output(output_path, candidate_edges[:k])    # k edges on disk before the engine setup
+
+    engine_setup = time.perf_counter()
+    engine, adj = None, None
+    if engine_name == 'python':
+        adj = graph.adjacency()
+    elif engine_name == 'batch':
+        engine = BatchEngine(graph, seeds, hops, rng)
+    elif engine_name == 'dominator' and hops != -1:
+        print("[WARN] dominator gains need unlimited hops; using the world store instead", flush=True)
+        engine_name = 'worlds'
+    if engine_name == 'worlds':
+        engine = WorldStore(graph, seeds, hops, n_sim, rng)
+    elif engine_name == 'dominator':
+        engine = DominatorEngine(graph, seeds, hops, n_sim, rng)
+    elif engine_name == 'sketch':
+        n_sketches = int(options.get('sketches', SKETCHES_PER_SIM * n_sim))
+        engine = SketchEngine(graph, seeds, hops, n_sketches, candidate_edges, rng)
+    PROFILE.add_time('engine_setup', engine_setup)
+    print(f"[INFO] Engine: {engine_name}, seed={seed}", flush=True)
+
+    bounds = None
+    if 'prune' in options:
+        with PROFILE.phase('bounds'):
+            bounds = gain_bounds(graph, seeds, hops, engine, candidate_edges, options['prune'], seed)
+
+    reuse, previous = None, None
+    if 'update' in options:
+        with PROFILE.phase('update'):
+            reuse, previous = reusable_gains(graph, seeds, hops, n_sim, candidate_edges,
+                                             options['update'], options['diff'],
+                                             float(options.get('min-prob', UPDATE_MIN_PROB)))
+
+    if checkpoint is not None:
+        checkpoint.meta = dict(graph=os.path.abspath(graph_path), seeds=os.path.abspath(seed_path),
+                               k=k, n_sim=n_sim, hops=hops, engine=engine_name, seed=seed,
+                               parallel=bool(workers), adaptive=delta, prune=options.get('prune'),
+                               sketches=options.get('sketches'), n_candidates=len(candidate_edges),
+                               update=options.get('update'), diff=options.get('diff'),
+                               min_prob=options.get('min-prob'))
+        if resume is not None and resume['meta'] != checkpoint.meta:
+            print(f"[ERROR] {checkpoint.path} was written by a run with different arguments", flush=True)
+            sys.exit(1)
+
+    warm_gains = {}
+
+    def on_warm(heap):
+        # exact: scored at the full simulation count (iteration 0 in the heap)
+        warm_gains.update(((u, v), (-neg_gain, it == 0)) for neg_gain, it, u, v in heap)
+
+    pool = None
+    if workers:
+        engine = pool = ParallelEvaluator(engine, seeds, workers, seed)
+        print(f"[INFO] Workers: {workers}", flush=True)
+    try:
+        selected = celf_greedy(adj, candidate_edges, None, seeds, k, n_sim, hops, output_path,
+                               engine, delta, deadline, bounds, checkpoint, resume,
+                               reuse=reuse, on_warm=on_warm)
+    finally:
+        if pool is not None:
+            pool.close()
     write_output(output_path, selected)
+    if previous is not None:
+        kept = len(set(previous) & set(selected))
+        print(f"[INFO] Update kept {kept}/{len(previous)} edges of the previous blocking set", flush=True)
+    if 'save-gains' in options:
+        path = options['save-gains'] if options['save-gains'] is not True else output_path + '.gains.npz'
+        if warm_gains:
+            save_gains(path, warm_gains, selected, seeds, hops, n_sim)
+            print(f"[INFO] Gains of {len(warm_gains)} candidates saved to {path}", flush=True)
+        else:
+            print("[WARN] --save-gains: the warm-start ran before the resumed checkpoint; "
+                  "nothing saved", flush=True)
+    if checkpoint is not None:
+        checkpoint.discard()      # finished: a later --resume starts afresh
+    if PROFILE.enabled:
+        path = options['profile'] if options['profile'] is not True else output_path + '.profile.json'
+        PROFILE.write(path, graph=graph_path, seeds=seed_path, k=k, n_sim=n_sim, hops=hops,
+                      engine=engine_name, workers=workers, seed=seed,
+                      n_nodes=graph.n_nodes, n_edges=graph.n_edges,
+                      n_candidates=len(candidate_edges), selected=[list(e) for e in selected])
+        print(f"[INFO] Profile written to {path}", flush=True)
     print("[INFO] Done.", flush=True)
 
 
-def prefilter_edges(adj, edges, seeds, hops):
+def gain_bounds(graph, seeds, hops, engine, edges, pilot, seed):
+    """Upper bounds on the blocking gain of ``edges``, or None when not worth it.
+
+    Engines that store worlds are bounded on their own worlds, so pruning
+    never drops an edge they would have picked; other engines get a small
+    pilot world store of its own random stream.
+    """
+    if getattr(engine, 'one_pass_gains', False):
+        print("[INFO] --prune: this engine scores all edges in one pass already", flush=True)
+        return None
+    if isinstance(engine, WorldStore):
+        store = engine
+    else:
+        n_pilot = PILOT_SIMS if pilot is True else int(pilot)
+        rng = np.random.default_rng([seed, 1]) if seed is not None else None
+        store = WorldStore(graph, seeds, hops, n_pilot, rng)
+    bounds = store.gain_bounds(set(), edges, store.n_sim)
+    print(f"[INFO] Gain bounds from {store.n_sim} worlds: "
+          f"{sum(b > 0 for b in bounds)}/{len(edges)} candidates can gain", flush=True)
+    return bounds
+
+
+def reusable_gains(graph, seeds, hops, n_sim, edges, prev_path, diff_path, min_prob):
+    """Saved gains still valid after the changes in ``diff_path``, and the previous selection.
+
+    ``graph`` is the updated graph; the diff lists how it differs from the
+    graph the gains in ``prev_path`` were computed on.
+    """
+    prev = load_gains(prev_path)
+    if prev['hops'] != hops or not np.array_equal(prev['seeds'], np.unique(np.asarray(seeds, dtype=np.int64))):
+        print(f"[ERROR] {prev_path} was computed for a different seed set or hop limit", flush=True)
+        sys.exit(1)
+    changes = load_diff(diff_path)
+    missing = sum(op != '-' and not len(graph.positions([(u, v)])) for op, u, v, _ in changes)
+    if missing:
+        print(f"[WARN] {missing} added or updated edges of the diff are not in the graph; "
+              f"pass the updated graph", flush=True)
+
+    affected = affected_candidates(graph, edges, changes, min_prob)
+    exact = prev['n_sim'] == n_sim      # other counts: reused gains only order the heap
+    reuse = {e: (prev['gains'][e][0], prev['gains'][e][1] and exact)
+             for e, hit in zip(edges, affected.tolist()) if not hit and e in prev['gains']}
+    print(f"[INFO] Diff: {len(changes)} edge changes; {int(affected.sum())}/{len(edges)} "
+          f"candidates in the affected region", flush=True)
+    return reuse, prev['selected']
+
+
+def prefilter_edges(graph, seeds, hops):
     if hops == -1:
-        reachable = bfs_reachable(adj, seeds, limit=None)
+        reachable = bfs_reachable(graph, seeds, limit=None)
     else:
-        reachable = bfs_reachable(adj, seeds, limit=hops - 1)  # u must be within hops-1 of seeds
+        reachable = bfs_reachable(graph, seeds, limit=hops - 1)  # u must be within hops-1 of seeds
 
-    return [(u, v) for (u, v) in edges if u in reachable]
+    return graph.edge_list(reachable[graph.src])
 
 
-def bfs_reachable(adj, seeds, limit):
-    visited = set(seeds)
-    queue   = deque((s, 0) for s in seeds)
-    while queue:
-        u, d = queue.popleft()
-        if limit is not None and d >= limit:
-            continue
-        for (v, _) in adj[u]:
-            if v not in visited:
-                visited.add(v)
-                queue.append((v, d + 1))
+def bfs_reachable(graph, seeds, limit):
+    """Boolean mask of the nodes within ``limit`` hops of the seeds (None = unlimited)."""
+    visited  = np.zeros(graph.n_nodes, dtype=bool)
+    frontier = graph.node_indices(seeds)
+    visited[frontier] = True
+    depth = 0
+    while len(frontier) and (limit is None or depth < limit):
+        nxt = graph.indices[frontier_edges(graph, frontier)[0]]
+        frontier = np.unique(nxt[~visited[nxt]])
+        visited[frontier] = True
+        depth += 1
     return visited
 
 
@@ -1,23 +1,84 @@
 #!/bin/bash
 # forest_fire.sh
-# Usage: bash forest_fire.sh <graph_path> <seed_set_path> <output_path> <k> <n_random_instances> <hops>
+# Usage: bash forest_fire.sh <graph_path> <seed_set_path> <output_path> <k> <n_random_instances> <hops> [options]
 
 GRAPH_PATH=$1
 SEED_PATH=$2
 OUTPUT_PATH=$3
 K=$4
 N_RANDOM=$5
-HOPS=$6
+HOPS=${6:--1}
+OPTS_FROM=7
+
+# hops is optional: options may start right after num_sim
+if [[ "$HOPS" == --* ]]; then
+    HOPS=-1
+    OPTS_FROM=6
+fi
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
-if [ "$#" -lt 5 ] || [ "$#" -gt 6 ]; then
-    echo "Usage: bash forest_fire.sh <graph_file> <seed_file> <output_path> <k> <num_sim> [hops]"
+if [ "$2" = "--serve" ]; then
+    exec python3 "$SCRIPT_DIR/forest_fire.py" "$GRAPH_PATH" "${@:2}"
+fi
+
+if [ "$#" -lt 5 ]; then
+    echo "Usage: bash forest_fire.sh <graph_file> <seed_file> <output_path> <k> <num_sim> [hops] [options]"
     echo ""
     echo "  hops  (optional) — limit fire spread to this many hops from the seed set."
     echo "                     Pass -1 or omit for unlimited spread (default)."
+    echo "  --engine python|batch|worlds|dominator|sketch"
+    echo "                   — simulation engine; 'batch' runs all samples at once"
+    echo "                     as a bit matrix, 'worlds' samples n_sim live-edge"
+    echo "                     worlds once and reuses them, 'dominator' scores all"
+    echo "                     edges per world via dominator trees (unlimited hops"
+    echo "                     only), 'sketch' estimates from reverse-reachable"
+    echo "                     sketches indexed by edge (default: python)."
+    echo "  --sketches N     — RR sketch pool size for --engine sketch"
+    echo "                     (default: 10 * num_sim)."
+    echo "  --seed N         — seed all random number generators."
+    echo "  --workers N      — evaluate candidates on N processes sharing the graph;"
+    echo "                     the result does not depend on N."
+    echo "  --adaptive DELTA — stop each candidate's simulations early once a"
+    echo "                     confidence interval decides it; DELTA bounds the"
+    echo "                     chance that any of the run's tests errs. Runs on"
+    echo "                     stored worlds (python/batch switch to 'worlds');"
+    echo "                     ignored with --workers and --engine sketch."
+    echo "  --prune [PILOT]  — bound every candidate's gain by its BFS-tree subtree"
+    echo "                     and skip candidates that cannot beat the k-th best"
+    echo "                     exact gain; bounds use the stored worlds, or PILOT"
+    echo "                     sampled worlds for other engines (default: 64)."
+    echo "  --time-budget S  — anytime mode: size the simulation counts to finish"
+    echo "                     within S seconds of wall-clock time; k edges are"
+    echo "                     always in the output before the deadline."
+    echo "  --checkpoint [PATH]"
+    echo "                   — save the search state every 60 s (--checkpoint-every)"
+    echo "                     to PATH (default: <output_path>.ckpt)."
+    echo "  --resume         — continue from that checkpoint; gives the same result"
+    echo "                     as an uninterrupted run with the same arguments."
+    echo "  --save-gains [PATH]"
+    echo "                   — save every candidate's warm-start gain and the selection"
+    echo "                     (default: <output_path>.gains.npz) for a later --update."
+    echo "  --update PREV --diff FILE"
+    echo "                   — re-optimize the updated graph from the gains saved in"
+    echo "                     PREV; only candidates near the edge changes in FILE"
+    echo "                     ('+ u v p' added, '- u v' removed, 'u v p' new p) are"
+    echo "                     scored again."
+    echo "  --min-prob P     — with --update, a candidate is near a change when a path"
+    echo "                     of probability >= P links them (default: 0.01; 0 re-scores"
+    echo "                     everything that can reach a change)."
+    echo "  --no-cache       — do not read or write the <graph>.csr.npz cache."
+    echo "  --profile [PATH] — count simulations, edge relaxations and CELF heap"
+    echo "                     traffic, time each phase and round, and write them"
+    echo "                     as JSON (default: <output_path>.profile.json)."
+    echo ""
+    echo "Server mode: bash forest_fire.sh <graph_file> --serve [--socket PATH] [--cache-mb MB]"
+    echo "                   — load the graph once and answer JSON-line queries such as"
+    echo "                     {\"id\": 1, \"seeds\": [3, 7], \"k\": 5, \"n_sim\": 200} on stdin"
+    echo "                     (or a Unix socket), streaming each selection as it is"
+    echo "                     made; sampled worlds are cached up to MB (default: 1024)."
     exit 1
 fi
 
 python3 "$SCRIPT_DIR/forest_fire.py" \
-    "$GRAPH_PATH" "$SEED_PATH" "$OUTPUT_PATH" "$K" "$N_RANDOM" "$HOPS"
+    "$GRAPH_PATH" "$SEED_PATH" "$OUTPUT_PATH" "$K" "$N_RANDOM" "$HOPS" "${@:$OPTS_FROM}"